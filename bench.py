@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark every cipher engine and the enigma keyspace search
+Each case is timed on the bundled messages and on synthetic clear texts of growing size, giving its
+throughput and peak memory, the results can be saved as a JSON baseline and compared with a later run
+Every case is called once before being timed, then timed in loops of at least min_time seconds, the
+median of the loops being kept, and only the cases above a minimal time are compared with a baseline
+The result cache is disabled when run from the command line so that every run does the work
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+import platform
+import tracemalloc
+import statistics
+import numpy as np
+from text import CodeText
+from scoring import synthetic_text
+from keyspace import Keyspace
+from cache import CACHE_VARIABLE
+from main import messages, Scytale, Shift, Vigenere, Enigma, init_force_worker, force_shard
+
+SIZES = ['1K', '64K', '1M']
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+SCYTALE_COLUMNS = 7
+SHIFTS = [3, 12, 7, 5, 9]
+ROTORS, INIT_CONFIG = [4, 2, 7], [1, 2, 3]
+FORCE_SHARDS = 8
+
+"""
+Inputs
+"""
+
+
+def parse_size(size: str) -> int:
+    """
+    Get a number of chars from a size like 64K or 100M
+    :param size:
+    :return number of chars:
+    """
+    size = size.strip().upper()
+    if size[-1] in UNITS:
+        return int(float(size[:-1]) * UNITS[size[-1]])
+    return int(size)
+
+
+def scytale_encrypt(text: str, nb_columns: int) -> str:
+    """
+    Encrypt a text with a scytale, the inverse of its reading order
+    :param text:
+    :param nb_columns:
+    :return encrypted text:
+    """
+    codes = CodeText.from_text(text).codes
+    encrypted = np.empty_like(codes)
+    encrypted[Scytale.reading_order(len(codes), nb_columns)] = codes
+    return str(CodeText(encrypted))
+
+
+def shift_encrypt(text: str, shifts: list) -> str:
+    """
+    Encrypt a text by shifting char i by shifts[i % len(shifts)]
+    :param text:
+    :param shifts:
+    :return encrypted text:
+    """
+    return Shift.multi_decrypt(text, shifts)
+
+
+"""
+Cases
+"""
+
+
+def get_cases(size: int) -> list:
+    """
+    Get the cases run on a synthetic text of a given size
+    :param size: number of chars
+    :return list of (name, function, argument, amount of work, unit):
+    """
+    text = synthetic_text(size)
+    scytale = scytale_encrypt(text, SCYTALE_COLUMNS)
+    shift = shift_encrypt(text, SHIFTS[:1])
+    m_shift = shift_encrypt(text, SHIFTS[:2])
+    vigenere = shift_encrypt(text, SHIFTS)
+    enigma = Enigma(text, ROTORS, INIT_CONFIG, encrypted=False).message
+    return [
+        ('scytale_decrypt', lambda message: Scytale(message, SCYTALE_COLUMNS).clear_message, scytale, size, 'chars'),
+        ('shift_decrypt', lambda message: Shift(message).clear_message, shift, size, 'chars'),
+        ('shift_m_shift', lambda message: Shift(message, nb_m_shift=2, multiple_shift=True).clear_message, m_shift,
+         size, 'chars'),
+        ('vigenere_get_key', lambda message: Vigenere(message).key, vigenere, size, 'chars'),
+        ('vigenere_decrypt', lambda message: Vigenere(message).clear_message, vigenere, size, 'chars'),
+        ('enigma_crypt', lambda message: Enigma(message, ROTORS, INIT_CONFIG, encrypted=False).message, text, size,
+         'chars'),
+        ('enigma_decrypt', lambda message: Enigma(message, ROTORS, INIT_CONFIG).clear_message, enigma, size, 'chars'),
+    ]
+
+
+def get_message_cases() -> list:
+    """
+    Get the cases run on the bundled messages, with the parameters each one is encrypted with
+    :return list of (name, function, argument, amount of work, unit):
+    """
+    return [
+        ('scytale_crack[message1]', lambda message: Scytale.crack(message, max_columns=200), messages['message1'],
+         len(messages['message1']), 'chars'),
+        ('shift_decrypt[message2]', lambda message: Shift(message).clear_message, messages['message2'],
+         len(messages['message2']), 'chars'),
+        ('shift_m_shift[message4]', lambda message: Shift(message, nb_m_shift=2, multiple_shift=True).clear_message,
+         messages['message4'], len(messages['message4']), 'chars'),
+        ('vigenere_get_key[message6]', lambda message: Vigenere(message).key, messages['message6'],
+         len(messages['message6']), 'chars'),
+        ('vigenere_decrypt[message7]', lambda message: Vigenere(message).clear_message, messages['message7'],
+         len(messages['message7']), 'chars'),
+        ('enigma_decrypt[message8]', lambda message: Enigma(message, ROTORS, INIT_CONFIG).clear_message,
+         messages['message8'], len(messages['message8']), 'chars'),
+        force_case(messages['message8']),
+    ]
+
+
+def force_case(message: str, crib: str = 'Joel', nb_shards: int = FORCE_SHARDS) -> tuple:
+    """
+    Get the case testing the first shards of the deduplicated enigma_force keyspace in this process
+    :param message:
+    :param crib:
+    :param nb_shards:
+    :return (name, function, argument, amount of work, unit):
+    """
+    start = len(message) - len(crib)
+    keyspace = Keyspace().collapse(start, len(message))[0]
+    nb_shards = min(nb_shards, keyspace.nb_shards)
+    init_force_worker(message[-len(crib):], start, crib, keyspace)
+    nb_keys = sum(len(keyspace.shard(shard_id)) for shard_id in range(nb_shards))
+    return ('enigma_force[message8]', lambda shards: [force_shard(shard_id) for shard_id in shards],
+            range(nb_shards), nb_keys, 'keys')
+
+
+"""
+Measures
+"""
+
+
+def measure(function, argument, repeat: int = 5, min_time: float = 0.2) -> tuple:
+    """
+    Time a function, then run it once more under tracemalloc for its peak memory
+    A first call is not timed, so that what is built once, like the french model, is not counted, then
+    the function is called in loops of at least min_time seconds as timeit does
+    :param function:
+    :param argument:
+    :param repeat: number of timed loops, the median one being kept
+    :param min_time: minimal number of seconds of a loop
+    :return (seconds per call, number of calls per loop, peak memory in bytes):
+    """
+    function(argument)
+    timer = timeit.Timer(lambda: function(argument))
+    loops = 1
+    while timer.timeit(loops) < min_time:
+        loops *= 2
+    seconds = statistics.median(timer.repeat(repeat, loops)) / loops
+    tracemalloc.start()
+    try:
+        function(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, loops, peak
+
+
+def run_cases(cases: list, results: dict, repeat: int = 5, only: str = None, min_time: float = 0.2,
+              names: set = None):
+    """
+    Measure cases and print their results as they come
+    :param cases: list of (name, function, argument, amount of work, unit)
+    :param results: dictionary the results are added to
+    :param repeat: number of timed loops per case
+    :param only: only run the cases whose name contains this string
+    :param min_time: minimal number of seconds of a loop
+    :param names: only run the cases of these names
+    """
+    for name, function, argument, work, unit in cases:
+        if (only is not None and only not in name) or (names is not None and name not in names):
+            continue
+        seconds, loops, peak = measure(function, argument, repeat, min_time)
+        results[name] = {'seconds': seconds, 'loops': loops, 'throughput': work / seconds, 'unit': f'{unit}/s',
+                         'peak_memory': peak}
+        print(f'{name:<32} {work / seconds:>16,.0f} {unit}/s {seconds:>10.4f} s {peak / (1 << 20):>10.2f} MiB',
+              flush=True)
+
+
+def run(sizes: list, repeat: int = 5, with_messages: bool = True, only: str = None, min_time: float = 0.2,
+        names: set = None) -> dict:
+    """
+    Run the benchmark cases, the synthetic texts of one size at a time
+    :param sizes: sizes of the synthetic texts, like 64K
+    :param repeat: number of timed loops per case
+    :param with_messages: also run the cases on the bundled messages
+    :param only: only run the cases whose name contains this string
+    :param min_time: minimal number of seconds of a loop
+    :param names: only run the cases of these names
+    :return dictionary of results per case name:
+    """
+    results = {}
+    if with_messages:
+        run_cases(get_message_cases(), results, repeat, only, min_time, names)
+    for size in sizes:
+        if names is None or any(name.endswith(f'[{size}]') for name in names):
+            run_cases([(f'{name}[{size}]', *case) for name, *case in get_cases(parse_size(size))], results, repeat,
+                      only, min_time, names)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2, min_seconds: float = 1e-3) -> dict:
+    """
+    Compare results with a baseline
+    :param results:
+    :param baseline:
+    :param tolerance: allowed relative loss of throughput and gain of peak memory
+    :param min_seconds: cases whose call takes less than this in the baseline are too noisy to be compared
+    :return dictionary of the regression descriptions per case name:
+    """
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline or baseline[name]['seconds'] < min_seconds:
+            continue
+        reference, descriptions = baseline[name], []
+        if result['throughput'] < (1 - tolerance) * reference['throughput']:
+            descriptions.append(f"throughput {result['throughput']:,.0f} {result['unit']} "
+                                f"< {reference['throughput']:,.0f} {reference['unit']}")
+        if result['peak_memory'] > (1 + tolerance) * reference['peak_memory'] + (1 << 16):
+            descriptions.append(f"peak memory {result['peak_memory']:,} B > {reference['peak_memory']:,} B")
+        if descriptions:
+            regressions[name] = descriptions
+    return regressions
+
+
+def main():
+    """
+    Run the benchmark from the command line, exiting with 1 when a case regressed from the baseline
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', nargs='*', default=SIZES, help='sizes of the synthetic texts, like 1K 1M 100M')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed loops per case')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimal number of seconds of a loop')
+    parser.add_argument('--no-messages', action='store_true', help='skip the bundled messages')
+    parser.add_argument('--only', default=None, help='only run the cases whose name contains this string')
+    parser.add_argument('--save', default=None, help='save the results as a JSON baseline')
+    parser.add_argument('--compare', default=None, help='JSON baseline to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--min-seconds', type=float, default=1e-3,
+                        help='cases faster than this in the baseline are not compared')
+    arguments = parser.parse_args()
+    # the result cache would turn every run after the first into a lookup, and fill up with synthetic texts
+    os.environ[CACHE_VARIABLE] = 'off'
+    results = run(arguments.sizes, arguments.repeat, not arguments.no_messages, arguments.only, arguments.min_time)
+    if arguments.save is not None:
+        with open(arguments.save, 'w', encoding="utf8") as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      file, indent=1)
+    if arguments.compare is not None:
+        with open(arguments.compare, 'r', encoding="utf8") as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, arguments.tolerance, arguments.min_seconds)
+        if regressions:
+            # a slower run can be noise from the rest of the machine, a case only regresses if it is slower again
+            print(f'Measuring {len(regressions)} slower cases again', file=sys.stderr)
+            again = run(arguments.sizes, arguments.repeat, not arguments.no_messages, arguments.only,
+                        arguments.min_time, set(regressions))
+            results.update({name: result for name, result in again.items()
+                            if result['throughput'] > results[name]['throughput']})
+            regressions = compare(results, baseline, arguments.tolerance, arguments.min_seconds)
+        for name, descriptions in regressions.items():
+            for description in descriptions:
+                print(f'REGRESSION {name}: {description}', file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+"""
+Main
+"""
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Give the persistent cache of the analyses and decryption results
+A result is stored in SQLite under a hash of (code version, data version, cipher, parameters, text), the
+least recently used ones being evicted once the cache is over its size, the data version being a digest
+of the french corpus and of the registered rotors so that changing them drops the results they gave
+The CRYPTO_CACHE environment variable gives the cache file, 'off' disabling the cache, the default one
+being in the user cache directory
+The cache is best effort: once the file cannot be opened or written, a warning is given and the results
+are computed again
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import warnings
+import scoring
+import rotors as rt
+from functools import lru_cache
+from text import CodeText
+
+CODE_VERSION = '4'
+CACHE_VARIABLE = 'CRYPTO_CACHE'
+DEFAULT_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                            'charpak-crypto', 'results.sqlite')
+DEFAULT_SIZE = 64 << 20
+MISSING = object()
+
+
+def get_data_version() -> str:
+    """
+    Get the version of the data the results depend on besides the code
+    :return digests of the french corpus and of the registered rotors:
+    """
+    return f'{scoring.reference_digest()}:{rt.registry.digest}'
+
+
+def make_key(cipher: str, text, params: dict = None, version: str = CODE_VERSION) -> str:
+    """
+    Get the key of a result
+    :param cipher: name of the analysis
+    :param text: text, CodeText or bytes the analysis ran on
+    :param params: JSON serializable parameters of the analysis
+    :param version: version of the code giving the result
+    :return hexadecimal key:
+    """
+    digest = hashlib.sha256()
+    for part in (version, get_data_version(), cipher, json.dumps(params, sort_keys=True, default=str)):
+        digest.update(part.encode('utf8') + b'\0')
+    if isinstance(text, CodeText):
+        text = str(text)
+    digest.update(text.encode('utf8', 'surrogatepass') if isinstance(text, str) else bytes(text))
+    return digest.hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, path: str = DEFAULT_PATH, max_size: int = DEFAULT_SIZE):
+        """
+        Init
+        The connection is opened on first use and again in every new process
+        :param path: SQLite file, None for a cache keeping nothing
+        :param max_size: number of bytes of values kept
+        """
+        self.path = path
+        self.max_size = max_size
+        self.connection = None
+        self.pid = None
+        self.size = None
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Get the connection of this process
+        :return connection:
+        """
+        if self.connection is None or self.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results '
+                                    '(key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)')
+            self.pid = os.getpid()
+            self.size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        return self.connection
+
+    def disable(self, error: Exception):
+        """
+        Stop using a cache file that cannot be opened or written
+        :param error:
+        """
+        warnings.warn(f'Result cache {self.path} disabled: {type(error).__name__}: {error}', RuntimeWarning)
+        self.path, self.connection = None, None
+
+    def get(self, key: str, default=None):
+        """
+        Get a result, marking it as used
+        :param key:
+        :param default: returned when the result is not in the cache
+        :return result:
+        """
+        if self.path is None:
+            return default
+        try:
+            connection = self.connect()
+            row = connection.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return default
+            connection.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+        except (sqlite3.Error, OSError) as error:
+            self.disable(error)
+            return default
+        return json.loads(row[0])
+
+    def __contains__(self, key: str) -> bool:
+        if self.path is None:
+            return False
+        try:
+            return self.connect().execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone() is not None
+        except (sqlite3.Error, OSError) as error:
+            self.disable(error)
+            return False
+
+    def set(self, key: str, value):
+        """
+        Store a result, evicting the least recently used ones if the cache is over its size
+        :param key:
+        :param value: JSON serializable result
+        """
+        if self.path is None:
+            return
+        text = json.dumps(value)
+        try:
+            connection = self.connect()
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                               (key, text, len(text), time.time()))
+            self.size += len(text)
+            if self.size > self.max_size:
+                self.evict()
+        except (sqlite3.Error, OSError) as error:
+            self.disable(error)
+
+    def evict(self):
+        """
+        Drop the least recently used results until the cache holds 90% of its size
+        """
+        connection = self.connect()
+        self.size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if self.size <= self.max_size:
+            return
+        excess, dropped = self.size - int(0.9 * self.max_size), []
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY used'):
+            if excess <= 0:
+                break
+            dropped.append((key,))
+            excess -= size
+            self.size -= size
+        connection.executemany('DELETE FROM results WHERE key = ?', dropped)
+
+    def clear(self):
+        """
+        Drop every result
+        """
+        if self.path is None:
+            return
+        try:
+            self.connect().execute('DELETE FROM results')
+            self.size = 0
+        except (sqlite3.Error, OSError) as error:
+            self.disable(error)
+
+    def cached(self, cipher: str, text, params: dict, compute):
+        """
+        Get a result from the cache, computing and storing it when it is not there or the cache fails
+        :param cipher: name of the analysis
+        :param text: text the analysis runs on
+        :param params: parameters of the analysis
+        :param compute: function giving the result
+        :return result, as read back from JSON:
+        """
+        key = make_key(cipher, text, params)
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = compute()
+            self.set(key, value)
+            value = json.loads(json.dumps(value))
+        return value
+
+
+def get_cache_directory() -> str:
+    """
+    Get the directory of the cache file given by the CRYPTO_CACHE environment variable
+    :return directory, None when the cache is off:
+    """
+    path = os.environ.get(CACHE_VARIABLE, DEFAULT_PATH)
+    return None if path.lower() == 'off' else os.path.dirname(os.path.abspath(path))
+
+
+@lru_cache(maxsize=None)
+def get_cache() -> ResultCache:
+    """
+    Get the cache shared by the analyses, from the CRYPTO_CACHE environment variable
+    :return cache:
+    """
+    path = os.environ.get(CACHE_VARIABLE, DEFAULT_PATH)
+    return ResultCache(None if path.lower() == 'off' else path)
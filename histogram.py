@@ -0,0 +1,86 @@
+"""
+Give the chars histogram used by the frequency analyses
+"""
+
+import numpy as np
+from text import CodeText
+
+
+class Histogram:
+
+    def __init__(self, counts=None):
+        """
+        Init
+        :param counts: count of each code point, indexed by code point
+        """
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_text(cls, text: str):
+        """
+        Count the chars of a text in a single pass
+        :param text: str or CodeText
+        :return histogram:
+        """
+        return cls(np.bincount(CodeText.from_text(text).codes))
+
+    @classmethod
+    def strided(cls, text: str, period: int) -> list:
+        """
+        Count the chars of every column of a given period in a single pass, column i being text[i::period]
+        :param text: str or CodeText
+        :param period:
+        :return list of histograms:
+        """
+        codes = CodeText.from_text(text).codes
+        alphabet = int(codes.max()) + 1 if len(codes) else 1
+        counts = np.bincount(np.arange(len(codes)) % period * alphabet + codes, minlength=period * alphabet)
+        return [cls(column) for column in counts.reshape(period, alphabet)]
+
+    def __add__(self, other):
+        size = max(len(self.counts), len(other.counts))
+        counts = np.zeros(size, dtype=np.int64)
+        counts[:len(self.counts)] += self.counts
+        counts[:len(other.counts)] += other.counts
+        return Histogram(counts)
+
+    def __getitem__(self, char: str) -> int:
+        code = ord(char)
+        return int(self.counts[code]) if code < len(self.counts) else 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.counts))
+
+    @staticmethod
+    def merge(histograms):
+        """
+        Merge histograms computed on chunks of a text, possibly in other processes
+        :param histograms:
+        :return merged histogram:
+        """
+        merged = Histogram()
+        for histogram in histograms:
+            merged = merged + histogram
+        return merged
+
+    def total(self) -> int:
+        """
+        Get the number of chars counted
+        :return number of chars:
+        """
+        return int(self.counts.sum())
+
+    def most_common(self) -> str:
+        """
+        Get the most frequent char
+        :return char:
+        """
+        return chr(int(self.counts.argmax()))
+
+    def to_dict(self) -> dict:
+        """
+        Get the histogram as a dictionary
+        :return dictionary of the freq:
+        """
+        codes = np.flatnonzero(self.counts)
+        return dict(zip(map(chr, codes.tolist()), self.counts[codes].tolist()))
@@ -0,0 +1,208 @@
+"""
+Give the keyspace of the enigma brute force
+"""
+
+import numpy as np
+from itertools import product
+
+
+def rank_permutation(perm, n: int) -> int:
+    """
+    Get the rank of a 3 elements permutation of range(n) in itertools.permutations order
+    :param perm:
+    :param n:
+    :return rank:
+    """
+    a, b, c = perm
+    return a * (n - 1) * (n - 2) + (b - (b > a)) * (n - 2) + (c - (c > a) - (c > b))
+
+
+def unrank_permutation(rank, n: int):
+    """
+    Get the 3 elements permutation of range(n) of a given rank, works on ints and numpy arrays
+    :param rank:
+    :param n:
+    :return permutation:
+    """
+    a, b, c = rank // ((n - 1) * (n - 2)), rank // (n - 2) % (n - 1), rank % (n - 2)
+    b = b + (b >= a)
+    low, high = np.minimum(a, b), np.maximum(a, b)
+    c = c + (c >= low)
+    c = c + (c >= high)
+    if isinstance(rank, np.ndarray):
+        return a, b, c
+    return int(a), int(b), int(c)
+
+
+def offset_classes(start: int, stop: int, level: int, nb_positions: int = 256) -> list:
+    """
+    Group the offsets of a rotor giving the same positions over the char indexes [start, stop)
+    The rotor at a given level moves every nb_positions ** level chars
+    :param start:
+    :param stop:
+    :param level:
+    :param nb_positions:
+    :return list of ranges of equivalent offsets:
+    """
+    step = nb_positions ** level
+    classes, first = [], 0
+    for offset in range(1, nb_positions):
+        if (stop - 1 + offset) // step > (start + first) // step:
+            classes.append(range(first, offset))
+            first = offset
+    classes.append(range(first, nb_positions))
+    return classes
+
+
+def count_distinct(c0: range, c1: range, c2: range) -> int:
+    """
+    Count the triples of distinct offsets taken from three ranges
+    :param c0:
+    :param c1:
+    :param c2:
+    :return number of triples:
+    """
+    def common(*ranges) -> int:
+        return max(0, min(r.stop for r in ranges) - max(r.start for r in ranges))
+
+    return (len(c0) * len(c1) * len(c2) - common(c0, c1) * len(c2) - common(c0, c2) * len(c1)
+            - common(c1, c2) * len(c0) + 2 * common(c0, c1, c2))
+
+
+class Keyspace:
+
+    def __init__(self, nb_rotors: int = 8, nb_positions: int = 256, shard_size: int = 1000, offsets=None):
+        """
+        Init
+        A key index is offset_rank * nb_orders + order_rank, so a shard holds every rotor order for
+        shard_size consecutive offsets, like a part of the old get_combi
+        :param nb_rotors:
+        :param nb_positions:
+        :param shard_size:
+        :param offsets: explicit (M, 3) offsets to use instead of every permutation
+        """
+        self.nb_rotors = nb_rotors
+        self.nb_positions = nb_positions
+        self.shard_size = shard_size
+        self.nb_orders = nb_rotors * (nb_rotors - 1) * (nb_rotors - 2)
+        self.offsets = None if offsets is None else np.asarray(offsets, dtype=np.int64).reshape(-1, 3)
+        if self.offsets is None:
+            self.nb_offsets = nb_positions * (nb_positions - 1) * (nb_positions - 2)
+        else:
+            self.nb_offsets = len(self.offsets)
+            self.offset_ranks = {tuple(row): rank for rank, row in enumerate(self.offsets.tolist())}
+        self.size = self.nb_orders * self.nb_offsets
+        self.nb_shards = -(-self.nb_offsets // shard_size)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def key(self, index: int) -> tuple:
+        """
+        Get the key of a given index
+        :param index:
+        :return (rotor order, offsets):
+        """
+        offset_rank, order_rank = divmod(index, self.nb_orders)
+        if self.offsets is not None:
+            return unrank_permutation(order_rank, self.nb_rotors), tuple(self.offsets[offset_rank].tolist())
+        return unrank_permutation(order_rank, self.nb_rotors), unrank_permutation(offset_rank, self.nb_positions)
+
+    def index(self, key) -> int:
+        """
+        Get the index of a given key
+        :param key: (rotor order, offsets)
+        :return index:
+        """
+        order, offsets = key
+        if self.offsets is not None:
+            return self.offset_ranks[tuple(offsets)] * self.nb_orders + rank_permutation(order, self.nb_rotors)
+        return (rank_permutation(offsets, self.nb_positions) * self.nb_orders
+                + rank_permutation(order, self.nb_rotors))
+
+    def shard(self, shard_id: int) -> range:
+        """
+        Get the key indexes of a shard
+        :param shard_id:
+        :return range of key indexes:
+        """
+        start = shard_id * self.shard_size * self.nb_orders
+        return range(start, min(start + self.shard_size * self.nb_orders, self.size))
+
+    def iter_keys(self, start: int = 0, stop: int = None):
+        """
+        Lazily yield the keys between two indexes
+        :param start:
+        :param stop:
+        :return generator of keys:
+        """
+        if stop is None:
+            stop = self.size
+        for index in range(start, stop):
+            yield self.key(index)
+
+    def block(self, start: int, stop: int) -> np.ndarray:
+        """
+        Get the keys between two indexes as rows [rotor0, rotor1, rotor2, offset0, offset1, offset2]
+        :param start:
+        :param stop:
+        :return (stop - start, 6) array of keys:
+        """
+        offset_rank, order_rank = np.divmod(np.arange(start, stop, dtype=np.int64), self.nb_orders)
+        if self.offsets is not None:
+            return np.column_stack(unrank_permutation(order_rank, self.nb_rotors) + (self.offsets[offset_rank],))
+        return np.stack(unrank_permutation(order_rank, self.nb_rotors)
+                        + unrank_permutation(offset_rank, self.nb_positions), axis=1)
+
+    def shard_block(self, shard_id: int) -> np.ndarray:
+        """
+        Get the keys of a shard as an array
+        :param shard_id:
+        :return array of keys:
+        """
+        shard = self.shard(shard_id)
+        return self.block(shard.start, shard.stop)
+
+    def collapse(self, start: int, stop: int) -> tuple:
+        """
+        Keep one key per class of keys giving the same rotor positions over the char indexes [start, stop)
+        :param start:
+        :param stop:
+        :return collapsed keyspace and number of offsets each kept offset stands for:
+        """
+        if self.offsets is not None:
+            raise ValueError("Only a full keyspace can be collapsed")
+        classes = [offset_classes(start, stop, level, self.nb_positions) for level in range(3)]
+        offsets, weights = [], []
+        for c0, c1, c2 in product(*classes):
+            weight = count_distinct(c0, c1, c2)
+            if weight:
+                offsets.append(next(key for key in product(c0, c1, c2) if len(set(key)) == 3))
+                weights.append(weight)
+        collapsed = Keyspace(self.nb_rotors, self.nb_positions, self.shard_size, offsets=offsets)
+        return collapsed, weights
+
+    def expand(self, offsets, start: int, stop: int) -> np.ndarray:
+        """
+        Get every offsets of the class an offsets of a collapsed keyspace stands for, see collapse
+        :param offsets:
+        :param start:
+        :param stop:
+        :return (weight, 3) array of offsets, the ones kept by collapse first:
+        """
+        ranges = [next(c for c in offset_classes(start, stop, level, self.nb_positions) if offset in c)
+                  for level, offset in enumerate(offsets)]
+        members = np.array(list(product(*ranges)), dtype=np.int64).reshape(-1, 3)
+        distinct = ((members[:, 0] != members[:, 1]) & (members[:, 0] != members[:, 2])
+                    & (members[:, 1] != members[:, 2]))
+        return members[distinct]
+
+    def collapse_report(self, collapsed) -> str:
+        """
+        Describe how much of the keyspace a collapsed keyspace removes
+        :param collapsed:
+        :return report:
+        """
+        return (f'{len(collapsed)} effective keys out of {len(self)} '
+                f'({100 * (1 - len(collapsed) / len(self)):.6f}% removed), '
+                f'{collapsed.nb_shards} parts to test out of {self.nb_shards}')
@@ -12,13 +12,26 @@ Library import
 """
 
 import rotors as rt
+from keyspace import Keyspace
+from predicates import Crib
+from metrics import Counters, Collector, profile_call
+from store import MessageStore
+from cache import get_cache, make_key
+from histogram import Histogram
+from text import CodeText
+from scoring import get_french_scorer, get_french_frequencies
 import os
+import mmap
+import codecs
+import random
+import numpy as np
 from tqdm import tqdm
-from tqdm import trange
-from itertools import product
-from itertools import permutations
-
-# from multiprocessing.pool import ThreadPool
+from functools import lru_cache, cached_property
+from itertools import islice
+from collections import deque
+from contextlib import nullcontext
+from multiprocessing import Event
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 """
 Basic functions
@@ -27,16 +40,12 @@ Basic functions
 clear = lambda: os.system('cls')
 
 
-def import_messages() -> dict:
+def import_messages() -> MessageStore:
     """
-    Import all messages from message directory
-    :return dictionary of message:
+    Import all messages from message directory, next to this file, each one being read on first access
+    :return store of messages by name:
     """
-    msg = {}
-    for i in range(1, 9):
-        with open('messages/message{0}.txt'.format(i), 'r', encoding="utf8") as file:
-            msg["message{0}".format(i)] = file.read()
-    return msg
+    return MessageStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messages'))
 
 
 messages = import_messages()
@@ -48,7 +57,7 @@ def frequency(txt: str) -> dict:
     :param txt:
     :return dictionary of the freq:
     """
-    return {c: txt.count(c) for c in set(txt)}
+    return Histogram.from_text(txt).to_dict()
 
 
 def pgcd(a: int, b: int) -> int:
@@ -65,6 +74,48 @@ def pgcd(a: int, b: int) -> int:
         return pgcd(b, r)
 
 
+class ShiftTable(dict):
+
+    def __init__(self, shift: int):
+        """
+        Init
+        Table for str.translate shifting any code point, filled the first time a char is seen
+        :param shift:
+        """
+        super().__init__()
+        self.shift = shift
+
+    def __missing__(self, code: int) -> int:
+        if not 0 <= code + self.shift < 0x110000:
+            raise ValueError("chr() arg not in range(0x110000)")
+        self[code] = code + self.shift
+        return code + self.shift
+
+
+@lru_cache(maxsize=None)
+def get_shift_table(shift: int) -> ShiftTable:
+    """
+    Get the cached translate table of a shift
+    :param shift:
+    :return translate table:
+    """
+    return ShiftTable(shift)
+
+
+def index_of_coincidence(codes: np.ndarray, period: int = 1) -> float:
+    """
+    Get the index of coincidence of a text given as codes, pooling its columns for a given period
+    :param codes:
+    :param period:
+    :return index of coincidence:
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    alphabet = int(codes.max()) + 1 if len(codes) else 1
+    counts = np.bincount(np.arange(len(codes)) % period * alphabet + codes, minlength=period * alphabet)
+    sizes = counts.reshape(period, alphabet).sum(axis=1)
+    return float((counts * (counts - 1)).sum() / max(1, (sizes * (sizes - 1)).sum()))
+
+
 def rotate(array: list, n: int = 1) -> list:
     """
     Rotate a list n times
@@ -75,6 +126,61 @@ def rotate(array: list, n: int = 1) -> list:
     return array[n:] + array[:n]
 
 
+def get_rotor_tables(rotor_id: int) -> tuple:
+    """
+    Get the forward and inverse permutation tables of a rotor from the registry
+    :param rotor_id:
+    :return forward and inverse tables as bytes:
+    """
+    return rt.registry.tables(rotor_id)
+
+
+def get_stacked_tables() -> tuple:
+    """
+    Get every rotor's forward and inverse tables stacked in flat arrays (rotor i at i * 256)
+    :return flat forward and inverse tables:
+    """
+    return get_flat_tables(len(rt.registry))
+
+
+@lru_cache(maxsize=None)
+def get_flat_tables(nb_rotors: int) -> tuple:
+    """
+    Get the flat tables of the registry holding a given number of rotors, rotors only being added
+    :param nb_rotors:
+    :return flat forward and inverse tables:
+    """
+    return (rt.registry.forward_stack[:nb_rotors].ravel().astype(np.int64),
+            rt.registry.inverse_stack[:nb_rotors].ravel().astype(np.int64))
+
+
+def decrypt_keys(code: int, index: int, bases: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Decrypt one char under many keys of enigma_force
+    :param code:
+    :param index: index of the char in the whole message
+    :param bases: (N, 3) rotor numbers times 256
+    :param offsets: (N, 3) offsets added to the char index
+    :return (N,) array of unencrypted codes:
+    """
+    inverse = get_stacked_tables()[1]
+    shifted = offsets + index
+    r0, r1, r2 = shifted[:, 0] & 255, (shifted[:, 1] >> 8) & 255, (shifted[:, 2] >> 16) & 255
+    code = inverse[bases[:, 2] + ((code + r2) & 255)]
+    code = inverse[bases[:, 1] + ((code - r2 + r1) & 255)]
+    return (inverse[bases[:, 0] + ((code - r1 + r0) & 255)] - r0) & 255
+
+
+def score_scytale_batch(batch: tuple) -> list:
+    """
+    Score the clear message prefixes of a batch of column numbers with the french model
+    :param batch: (array of the prefixes codes, list of column numbers, threshold of the scorer)
+    :return list of (score, nb_columns):
+    """
+    candidates, columns, threshold = batch
+    return list(zip(get_french_scorer().score(candidates, threshold).tolist(), columns))
+
+
 """
 Class
 """
@@ -92,56 +198,112 @@ class Scytale:
         self.encrypted = encrypted
         self.nbColumns = nb_columns
         self.message = message
-        self.table = self.table_filling()
-        self.clear_message = self.get_clear()
 
-    def separate_message(self) -> list:
+    @cached_property
+    def text(self) -> CodeText:
         """
-        Serapate the original message into chunck to complete column
-        :return array with message's chunks:
+        Codes of the message, converted on first access
+        :return code text:
         """
-        chunks, chunk_size = len(self.message), len(self.message) / self.nbColumns
-        chunk_size_mem = chunk_size
-        chunk_size = int(chunk_size)
-        if chunk_size_mem > chunk_size:
-            chunk_size += 1
-        msgs = [self.message[i:i + chunk_size] for i in range(0, chunks, chunk_size)]
-        return msgs
+        return CodeText.from_text(self.message)
 
-    def table_filling(self) -> list:
+    @cached_property
+    def clear_message(self) -> str:
         """
-        Fill the table with message's chunks
-        :return table fields according to the number of column provided:
+        Clear message, decrypted on first access
+        :return clear message:
         """
-        messages = self.separate_message()
-        table = [[] for i in range(self.nbColumns)]
-        for column in range(self.nbColumns):
-            for letter in messages[column]:
-                table[column].append(letter)
-        return table
+        return self.get_clear()
 
-    def table_reading(self) -> str:
+    @staticmethod
+    def get_chunk_size(length: int, nb_columns: int) -> int:
         """
-        Read table to decrypt message
-        :return unecrypted message:
+        Get the size of a column chunk
+        :param length: message length
+        :param nb_columns:
+        :return chunk size:
         """
-        unencrypted_message_table = []
-        table_length, column_length = len(self.table), len(self.table[0])
-        for i in range(column_length):
-            for j in range(table_length):
-                try:
-                    unencrypted_message_table.append(self.table[j][i])
-                except IndexError:
-                    nothing_happen = "well that's true"
-        unencrypted_message = ''.join(unencrypted_message_table)
-        return unencrypted_message
+        return -(-length // nb_columns)
 
     def decrypt(self) -> str:
         """
-        Decrypt the message
+        Decrypt the message by reading its codes in the reading order, without building the table
         :return unecrypted message:
         """
-        return self.table_reading()
+        return str(self.text[self.reading_order(len(self.text), self.nbColumns)])
+
+    @staticmethod
+    def reading_order(length: int, nb_columns: int, stop: int = None) -> np.ndarray:
+        """
+        Get the index in the encrypted message of each char of the clear message
+        :param length: message length
+        :param nb_columns:
+        :param stop: number of chars of the clear message, all of them by default
+        :return array of indexes:
+        """
+        chunk_size = Scytale.get_chunk_size(length, nb_columns)
+        nb_chunks = -(-length // chunk_size)
+        stop = length if stop is None else min(stop, length)
+        # only the last chunk can be short, so at most one index in nb_chunks is dropped
+        position = np.arange(min(nb_chunks * chunk_size, 2 * stop + nb_chunks))
+        order = position % nb_chunks * chunk_size + position // nb_chunks
+        return order[order < length][:stop]
+
+    @staticmethod
+    def crack(message: str, max_columns: int = None, top: int = 5, batch_size: int = 64, workers: int = 1,
+              threshold: float = None, sample: int = 2048, progress=None) -> list:
+        """
+        Try every number of columns and rank the clear messages with the french scorer
+        :param message:
+        :param max_columns:
+        :param top: number of candidates returned
+        :param batch_size: number of candidates scored at once
+        :param workers: number of worker processes scoring the batches
+        :param threshold: mean score per char under which a candidate stops being scored
+        :param sample: number of chars scored at the beginning of each clear message
+        :param progress: called with ('columns', batches scored, number of batches) after each batch
+        :return list of (score, nb_columns, clear message), best first:
+        """
+        if max_columns is None:
+            max_columns = max(2, len(message) // 2)
+        params = {'max_columns': max_columns, 'top': top, 'threshold': threshold, 'sample': sample}
+        best = get_cache().cached('scytale.crack', message, params, lambda: Scytale.rank_columns(
+            message, max_columns, top, batch_size, workers, threshold, sample, progress))
+        return [(score, nb_columns, Scytale(message, nb_columns).clear_message) for score, nb_columns in best]
+
+    @staticmethod
+    def rank_columns(message: str, max_columns: int, top: int = 5, batch_size: int = 64, workers: int = 1,
+                     threshold: float = None, sample: int = 2048, progress=None) -> list:
+        """
+        Score the clear message prefix of every number of columns, see crack
+        Numbers of columns giving the same chunk size give the same clear message, only the smallest
+        one is scored, so a message of n chars has about 2 * sqrt(n) candidates
+        :param message:
+        :param max_columns:
+        :param top:
+        :param batch_size:
+        :param workers:
+        :param threshold:
+        :param sample:
+        :param progress:
+        :return list of (score, nb_columns), best first:
+        """
+        codes = CodeText.from_text(message).symbols()
+        chunk_sizes = {}
+        for nb_columns in range(2, max_columns + 1):
+            chunk_sizes.setdefault(Scytale.get_chunk_size(len(codes), nb_columns), nb_columns)
+        columns = list(chunk_sizes.values())
+        batches = ((np.stack([codes[Scytale.reading_order(len(codes), nb_columns, sample)]
+                              for nb_columns in columns[i:i + batch_size]]), columns[i:i + batch_size], threshold)
+                   for i in range(0, len(columns), batch_size))
+        nb_batches, scores = -(-len(columns) // batch_size), []
+        with ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+            for done, batch in enumerate(map(score_scytale_batch, batches) if pool is None
+                                         else pool.map(score_scytale_batch, batches), 1):
+                scores += batch
+                if progress is not None:
+                    progress('columns', done, nb_batches)
+        return sorted(scores, reverse=True)[:top]
 
     def get_clear(self) -> str:
         """
@@ -154,6 +316,18 @@ class Scytale:
             message = self.message
         return message
 
+    def get_clear_slice(self, start: int = 0, stop: int = None) -> str:
+        """
+        Get a slice of the clear message, only reading the encrypted chars it is made of
+        :param start:
+        :param stop:
+        :return clear message slice:
+        """
+        if not self.encrypted or 'clear_message' in self.__dict__:
+            return self.clear_message[start:stop]
+        start, stop, step = slice(start, stop).indices(len(self.message))
+        return str(self.text[self.reading_order(len(self.text), self.nbColumns)[start:stop]])
+
 
 class Shift:
 
@@ -174,28 +348,85 @@ class Shift:
         self.nb_shift = nb_shift
         self.multiple_shift = multiple_shift
         self.nb_m_shift = nb_m_shift
-        self.clear_message = self.get_clear()
+
+    @cached_property
+    def text(self) -> CodeText:
+        """
+        Codes of the message, converted on first access
+        :return code text:
+        """
+        return CodeText.from_text(self.message)
+
+    @cached_property
+    def clear_message(self) -> str:
+        """
+        Clear message, decrypted on first access
+        :return clear message:
+        """
+        return self.get_clear()
+
+    @cached_property
+    def shifts(self) -> list:
+        """
+        Shift of each column, a single one unless multiple_shift, found on first access
+        :return list of shifts:
+        """
+        if self.multiple_shift:
+            histograms = Histogram.strided(self.text, self.nb_m_shift)
+            return [ord(" ") - ord(histogram.most_common()) for histogram in histograms]
+        if self.auto_shift:
+            return [self.get_shift(self.message)]
+        return [self.nb_shift]
 
     def decrypt(self, message: str, shift: int) -> str:
         """
-        Decrypt a shift encrypted message
-        :param message:
+        Decrypt a shift encrypted message, with a cached translate table for short str messages and an
+        array of code points for long ones and CodeText
+        :param message: str or CodeText
         :param shift:
         :return unencrypted message:
         """
-        unencrypted_message = ''.join([chr(ord(letter) + shift) for letter in message])
-        return unencrypted_message
+        if isinstance(message, str) and len(message) < 4096:
+            return message.translate(get_shift_table(shift))
+        return self.multi_decrypt(message, [shift])
 
     def get_shift(self, message: str) -> int:
         """
-        Get the shift of a message
+        Get the shift of a message from the cache, searching it when it is not there
         :param message:
         :return shift:
         """
-        freqs = frequency(message)
-        letter = max(freqs.keys(), key=lambda x: freqs[x])
-        shift = ord(" ") - ord(letter)
-        return shift
+        return get_cache().cached('shift.shift', message, None, lambda: self.search_shift(message))
+
+    def search_shift(self, message: str) -> int:
+        """
+        Search the shift of a message, the best one for the french scorer when the message allows it
+        :param message:
+        :return shift:
+        """
+        ranking = self.rank_shifts(message, top=1)
+        if ranking:
+            return ranking[0][1]
+        return ord(" ") - ord(Histogram.from_text(message).most_common())
+
+    @staticmethod
+    def rank_shifts(message: str, top: int = 5, sample: int = 2048) -> list:
+        """
+        Rank every shift keeping the message in the 256 symbols alphabet with the french scorer
+        :param message:
+        :param top: number of shifts returned
+        :param sample: number of chars scored
+        :return list of (score, shift), best first:
+        """
+        codes = CodeText.from_text(message[:sample]).widen()
+        if not len(codes):
+            return []
+        candidates = np.arange(-codes.min(), 256 - codes.max())
+        if not len(candidates):
+            return []
+        scores = get_french_scorer().score(codes + candidates[:, None])
+        best = np.argsort(-scores)[:top]
+        return [(float(scores[i]), int(candidates[i])) for i in best]
 
     def auto_decrypt(self, message: str) -> str:
         """
@@ -206,24 +437,25 @@ class Shift:
         unencrypted_message = self.decrypt(message, self.get_shift(message))
         return unencrypted_message
 
+    @staticmethod
+    def multi_decrypt(message: str, shifts: list) -> str:
+        """
+        Decrypt a message whose char i is shifted by shifts[i % len(shifts)]
+        :param message:
+        :param shifts:
+        :return unencrypted message:
+        """
+        codes = CodeText.from_text(message).widen()
+        for column, shift in enumerate(shifts):
+            codes[column::len(shifts)] += shift
+        return str(CodeText(codes))
+
     def m_shift(self) -> str:
         """
-        Decrypt a message with multiple shift
+        Decrypt a message with multiple shift, the histogram of every column coming from one pass
         :return unencrypted message:
         """
-        part_table = [[] for i in range(self.nb_m_shift)]
-        trans_message, unecrypted_message = [], []
-        for index, letter in enumerate(self.message):
-            part_table[index % self.nb_m_shift].append(letter)
-        for part in part_table:
-            trans_message.append(self.auto_decrypt(''.join(part)))
-        for i in range(len(max(trans_message, key=len))):
-            for j in range(len(trans_message)):
-                try:
-                    unecrypted_message.append(trans_message[j][i])
-                except IndexError:
-                    nothing_happen = "well that's true"
-        return ''.join(unecrypted_message)
+        return self.multi_decrypt(self.text, self.shifts)
 
     def get_clear(self) -> str:
         """
@@ -240,67 +472,232 @@ class Shift:
             message = self.message
         return message
 
+    def get_clear_slice(self, start: int = 0, stop: int = None) -> str:
+        """
+        Get a slice of the clear message, only decrypting the chars it is made of
+        :param start:
+        :param stop:
+        :return clear message slice:
+        """
+        if not self.encrypted or 'clear_message' in self.__dict__:
+            return self.clear_message[start:stop]
+        start, stop, step = slice(start, stop).indices(len(self.message))
+        return self.multi_decrypt(self.text[start:stop], rotate(self.shifts, start % len(self.shifts)))
+
 
 class Vigenere:
 
-    def __init__(self, message: str, encrypted: bool = True):
+    def __init__(self, message: str, encrypted: bool = True, shifts: list = None):
         """
         Init
         :param message:
         :param encrypted:
+        :param shifts: shift of each column of a key already recovered, skips the analysis
         """
         self.message = message
         self.encrypted = encrypted
         self.size_repetition = 4
-        self.key = self.get_key()
-        self.clear_message = self.get_clear()
+        if shifts is not None:
+            self.shifts = list(shifts)
+            self.key = len(self.shifts)
+
+    @cached_property
+    def text(self) -> CodeText:
+        """
+        Codes of the message, converted on first access
+        :return code text:
+        """
+        return CodeText.from_text(self.message)
+
+    @cached_property
+    def key(self) -> int:
+        """
+        Key length, searched on first access
+        :return key length:
+        """
+        return self.get_key()
+
+    @cached_property
+    def shifts(self) -> list:
+        """
+        Shift of each column of the key, searched on first access
+        :return list of shifts:
+        """
+        return self.get_shifts()
 
-    def get_repetition(self, indice: int = 0) -> dict:
+    @cached_property
+    def clear_message(self) -> str:
         """
-        Get repetition of size x in a text
-        :param indice:
-        :return first repetition found based on given indice:
+        Clear message, decrypted on first access
+        :return clear message:
+        """
+        return self.get_clear()
+
+    def get_distances(self) -> np.ndarray:
         """
-        for i in range(indice, len(self.message) - self.size_repetition):
-            for j in range(i + self.size_repetition, len(self.message) - self.size_repetition):
-                if self.message[i:i + self.size_repetition] == self.message[j:j + self.size_repetition]:
-                    return {
-                        "txt": [self.message[i:i + self.size_repetition],
-                                self.message[j:j + self.size_repetition]],
-                        "indice_i": i,
-                        "indice_j": j,
-                        "distance": j - i
-                    }
+        Get the distances between consecutive occurrences of every repeated chunk of size_repetition
+        chars, in a single sort of the chunks packed as integers
+        :return array of distances:
+        """
+        size = self.size_repetition
+        if len(self.message) <= size:
+            return np.array([], dtype=np.int64)
+        alphabet, codes = np.unique(self.text.codes, return_inverse=True)
+        chunks = np.zeros(len(codes) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            chunks = chunks * np.uint64(len(alphabet)) + codes[offset:len(chunks) + offset].astype(np.uint64)
+        if len(alphabet) ** size * len(chunks) < 2 ** 64:
+            ordered = np.sort(chunks * np.uint64(len(chunks)) + np.arange(len(chunks), dtype=np.uint64))
+            chunks, positions = np.divmod(ordered, np.uint64(len(chunks)))
+            positions = positions.astype(np.int64)
+        else:
+            positions = np.argsort(chunks, kind='stable')
+            chunks = chunks[positions]
+        repeated = chunks[1:] == chunks[:-1]
+        return (positions[1:] - positions[:-1])[repeated]
 
-    def get_key(self) -> int:
+    def max_key_length(self) -> int:
         """
-        Get vigenere key by getting the smallest distance between two chars repetition
+        Get the longest key length searched, every column keeping at least 10 chars
+        :return key length:
+        """
+        return max(2, len(self.message) // 10)
+
+    def kasiski(self, max_length: int = None, share: float = 0.0) -> dict:
+        """
+        Kasiski examination: share of the repetition distances divisible by each key length
+        A length dividing a share of the distances is at most the shortest of the longest distances
+        making this share, so no longer length is looked at
+        :param max_length: longest key length, see max_key_length
+        :param share: share of the distances a key length must divide to be kept
+        :return dictionary of the share by key length:
+        """
+        if max_length is None:
+            max_length = self.max_key_length()
+        distances = self.get_distances()
+        if not len(distances):
+            return {}
+        needed = len(distances) - max(1, int(np.ceil(share * len(distances))))
+        longest = min(max_length, int(np.partition(distances, needed)[needed]))
+        counts = np.bincount(distances)
+        shares = {length: float(counts[::length].sum() / len(distances)) for length in range(2, longest + 1)}
+        return {length: divided for length, divided in shares.items() if divided >= share}
+
+    def get_key(self, max_length: int = None, share: float = 0.9) -> int:
+        """
+        Get vigenere key length from the cache, searching it when it is not there
+        :param max_length: longest key length, see max_key_length
+        :param share: share of the distances the key length must divide
         :return Vigenere key:
         """
-        message_size = len(self.message)
-        repetition_distance, required_distance = message_size, message_size // 200
-        indice = 0
+        params = {'max_length': max_length, 'share': share}
+        return get_cache().cached('vigenere.key', self.message, params, lambda: self.search_key(max_length, share))
 
-        while repetition_distance > required_distance:
-            repetition = self.get_repetition(indice)
-            if indice == 0:
-                repetition_distance = repetition['distance']
-            else:
-                repetition_distance = pgcd(repetition['distance'], repetition_distance)
-            indice = repetition['indice_i'] + 1
-            if indice > len(self.message):
-                return False
+    def search_key(self, max_length: int = None, share: float = 0.9) -> int:
+        """
+        Search vigenere key length among the lengths dividing most repetition distances, or with the
+        index of coincidence when the message has no periodic repetition
+        The longest such length is the gcd of the distances left once the chance repetitions are put
+        aside, but with few repetitions it can be a multiple of the key, and the divisors of the key
+        divide the distances too, so the lengths found are told apart with the french scorer
+        :param max_length: longest key length, see max_key_length
+        :param share: share of the distances the key length must divide
+        :return Vigenere key:
+        """
+        if max_length is None:
+            max_length = self.max_key_length()
+        lengths = list(self.kasiski(max_length, share))
+        if lengths:
+            return self.score_key_lengths(lengths)[0][1]
+        return self.rank_key_lengths(max_length)[0][1]
 
-        vi_key = repetition_distance
+    def rank_key_lengths(self, max_length: int = None, top: int = 5, sample: int = 2048,
+                         ioc_sample: int = 16384) -> list:
+        """
+        Rank the key lengths with the best index of coincidence by scoring their decryption with the
+        french scorer
+        :param max_length: longest key length, see max_key_length
+        :param top: number of key lengths scored
+        :param sample: number of chars scored
+        :param ioc_sample: number of chars the index of coincidence is computed on
+        :return list of (score, key length), best first:
+        """
+        if max_length is None:
+            max_length = self.max_key_length()
+        codes = np.unique(self.text[:ioc_sample].codes, return_inverse=True)[1]
+        lengths = sorted(range(1, min(max_length, max(1, len(codes) // 20)) + 1),
+                         key=lambda length: -index_of_coincidence(codes, length))[:top]
+        return self.score_key_lengths(lengths, sample)
+
+    def score_key_lengths(self, lengths: list, sample: int = 2048) -> list:
+        """
+        Score the decryption of the message with the key of each length, see get_shifts
+        A multiple of the key length decrypting the message the same way, a tie goes to the shortest length
+        :param lengths:
+        :param sample: number of chars scored
+        :return list of (score, key length), best first:
+        """
+        codes, ranking = self.text[:sample].widen(), []
+        for length in lengths:
+            clear = codes + np.resize(self.get_shifts(length), len(codes))
+            ranking.append((get_french_scorer().score(clear), length))
+        return sorted(ranking, key=lambda rank: (-rank[0], rank[1]))
 
-        return vi_key
+    def get_shifts(self, key: int = None, top: int = 4, sample: int = 2048) -> list:
+        """
+        Get the shift of each column of the key, every shift of a column being tested at once against
+        the french chars distribution with a chi-squared statistic, then the best few shifts of each
+        column being told apart with the french scorer, short columns being too noisy for the chi-squared
+        A column spanning more than the 256 symbols, as with a wrong key length, only gets shifts keeping
+        its codes valid, the ones above the alphabet counting as the rarest symbol
+        :param key: key length, self.key by default
+        :param top: number of shifts of each column scored with the french scorer
+        :param sample: number of chars scored
+        :return list of shifts:
+        """
+        key = self.key if key is None else key
+        reference = get_french_frequencies()
+        shifts, candidates = [], []
+        for histogram in Histogram.strided(self.text, key):
+            counts = histogram.counts
+            observed = np.flatnonzero(counts)
+            if not len(observed):
+                shifts.append(0)
+                candidates.append(np.zeros(1, dtype=np.int64))
+                continue
+            shifted = np.arange(-observed.min(), 256 - observed.max())
+            if not len(shifted):
+                shifted = np.arange(-observed.min(), 256 - observed.min())
+            index = observed + shifted[:, None]
+            frequencies = np.where(index < 256, reference[np.minimum(index, 255)], reference.min())
+            chi2 = (counts[observed] ** 2 / frequencies).sum(axis=1)
+            candidates.append(shifted[np.argsort(chi2, kind='stable')[:top]])
+            shifts.append(int(candidates[-1][0]))
+        codes = self.text[:sample].widen()
+        for column in range(min(key, len(codes))):
+            if len(candidates[column]) > 1:
+                clear = np.tile(codes + np.resize(shifts, len(codes)), (len(candidates[column]), 1))
+                clear[:, column::key] = codes[column::key] + candidates[column][:, None]
+                scores = get_french_scorer().score(clear)
+                shifts[column] = int(candidates[column][scores.argmax()])
+        return shifts
+
+    @staticmethod
+    def decrypt_with(message: str, shifts: list) -> str:
+        """
+        Decrypt a message with the shift of each column of the key
+        :param message:
+        :param shifts:
+        :return unencrypted message:
+        """
+        return Shift.multi_decrypt(message, shifts)
 
     def decrypt(self) -> str:
         """
-        Decrypt Vigenere by using the multiple shift and the key given by get_key
+        Decrypt Vigenere with the shifts given by get_shifts
         :return unencrypted message:
         """
-        return Shift(self.message, nb_m_shift=self.key, multiple_shift=True).clear_message
+        return self.decrypt_with(self.text, self.shifts)
 
     def get_clear(self) -> str:
         """
@@ -313,6 +710,130 @@ class Vigenere:
             message = self.message
         return message
 
+    def get_clear_slice(self, start: int = 0, stop: int = None) -> str:
+        """
+        Get a slice of the clear message, only decrypting the chars it is made of
+        :param start:
+        :param stop:
+        :return clear message slice:
+        """
+        if not self.encrypted or 'clear_message' in self.__dict__:
+            return self.clear_message[start:stop]
+        start, stop, step = slice(start, stop).indices(len(self.message))
+        return self.decrypt_with(self.text[start:stop], rotate(self.shifts, start % self.key))
+
+
+class RotorEngine:
+
+    def __init__(self, ch_rotors: list, init_config: list = None, index_offsets: list = None):
+        """
+        Init
+        Rotor i is rotated by init_config[i] on top of its position, and its position is computed
+        from the character index shifted by index_offsets[i] (the offsets used by enigma_force)
+        :param ch_rotors:
+        :param init_config:
+        :param index_offsets:
+        """
+        if init_config is None:
+            init_config = [0, 0, 0]
+        if index_offsets is None:
+            index_offsets = [0, 0, 0]
+        tables = [get_rotor_tables(rotor_id) for rotor_id in ch_rotors]
+        self.forward = [table[0] for table in tables]
+        self.inverse = [table[1] for table in tables]
+        self.init_config = list(init_config)
+        self.index_offsets = list(index_offsets)
+
+    def positions(self, index: int) -> tuple:
+        """
+        Get the rotors positions for a given char index
+        :param index:
+        :return positions of rotor 0, 1 and 2:
+        """
+        o0, o1, o2 = self.index_offsets
+        return (index + o0) % 256, (index + o1) // 256 % 256, ((index + o2) // 256) // 256 % 256
+
+    def positions_array(self, start: int, length: int) -> tuple:
+        """
+        Get the rotors positions of consecutive chars at once
+        :param start: index of the first char
+        :param length: number of chars
+        :return arrays of the positions of rotor 0, 1 and 2:
+        """
+        index = np.arange(start, start + length, dtype=np.int64)
+        o0, o1, o2 = self.index_offsets
+        return (index + o0) % 256, (index + o1) // 256 % 256, (index + o2) // 65536 % 256
+
+    def decrypt_codes(self, codes: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Decrypt the codes of a message slice without a python loop, the rotor positions being a
+        function of the char index only
+        :param codes:
+        :param start: index of the first code in the whole message
+        :return array of unencrypted codes:
+        """
+        inv0, inv1, inv2 = [np.frombuffer(table, dtype=np.uint8) for table in self.inverse]
+        c0, c1, c2 = self.init_config
+        r0, r1, r2 = self.positions_array(start, len(codes))
+        code = (inv2[(np.asarray(codes, dtype=np.int64) + r2) & 255] - r2 - c2 + r1) & 255
+        code = (inv1[code] - r1 - c1 + r0) & 255
+        return ((inv0[code] - r0 - c0) & 255).astype(np.uint8)
+
+    def crypt_codes(self, codes: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Crypt the codes of a message slice without a python loop
+        :param codes:
+        :param start: index of the first code in the whole message
+        :return array of encrypted codes:
+        """
+        fwd0, fwd1, fwd2 = [np.frombuffer(table, dtype=np.uint8) for table in self.forward]
+        c0, c1, c2 = self.init_config
+        r0, r1, r2 = self.positions_array(start, len(codes))
+        code = (fwd0[(np.asarray(codes, dtype=np.int64) + r0 + c0) & 255] - r0 + r1 + c1) & 255
+        code = (fwd1[code] - r1 + r2 + c2) & 255
+        return ((fwd2[code] - r2) & 255).astype(np.uint8)
+
+    def decrypt(self, message, start: int = 0) -> str:
+        """
+        Decrypt a message whose first char is at index start of the whole message
+        :param message: str or CodeText
+        :param start:
+        :return unencrypted message:
+        """
+        return str(CodeText(self.decrypt_codes(CodeText.from_text(message).codes, start)))
+
+    def decrypt_checked(self, message, predicates: list, start: int = 0):
+        """
+        Decrypt a message char by char, giving up at the first char rejected by a predicate
+        :param message: str or CodeText
+        :param predicates:
+        :param start:
+        :return unencrypted message or None if a char was rejected:
+        """
+        inv0, inv1, inv2 = self.inverse
+        c0, c1, c2 = self.init_config
+        for predicate in predicates:
+            predicate.reset()
+        unencrypted_message = bytearray()
+        for index, letter in enumerate(CodeText.from_text(message).codes.tolist(), start):
+            r0, r1, r2 = self.positions(index)
+            code = (inv2[(letter + r2) & 255] - r2 - c2 + r1) & 255
+            code = (inv1[code] - r1 - c1 + r0) & 255
+            code = (inv0[code] - r0 - c0) & 255
+            if predicates and not all(predicate.accepts(index, code) for predicate in predicates):
+                return None
+            unencrypted_message.append(code)
+        return unencrypted_message.decode('latin-1')
+
+    def crypt(self, message, start: int = 0) -> str:
+        """
+        Crypt a message whose first char is at index start of the whole message
+        :param message: str or CodeText
+        :param start:
+        :return encrypted message:
+        """
+        return str(CodeText(self.crypt_codes(CodeText.from_text(message).codes, start)))
+
 
 class Enigma:
     message: str
@@ -329,12 +850,54 @@ class Enigma:
             ch_rotors = [0, 1, 2]
         if init_config is None:
             init_config = [0, 0, 0]
-        self.message = txt
         self.encrypted = encrypted
+        if encrypted:
+            self.message = txt
+        else:
+            self.clear_message = txt
         self.rotation, self.inverse_rotation = [0, 0, 0], [0, 0, 0]
-        self.rotors = self.set_rotors(ch_rotors, init_config)
-        self.initial_rotors = self.rotors
-        self.clear_message = self.get_clear()
+        self.ch_rotors, self.init_config = list(ch_rotors), list(init_config)
+        self.engine = RotorEngine(ch_rotors, init_config)
+
+    @cached_property
+    def rotors(self) -> list:
+        """
+        Rotated rotor lists of the obsolete char by char methods, built on first access
+        :return list of rotors:
+        """
+        return self.set_rotors(self.ch_rotors, self.init_config)
+
+    @cached_property
+    def initial_rotors(self) -> list:
+        """
+        Rotors as first built, the same lists as rotors
+        :return list of rotors:
+        """
+        return self.rotors
+
+    @cached_property
+    def message(self) -> str:
+        """
+        Encrypted message, crypted on first access when the object was built from a clear message
+        :return encrypted message:
+        """
+        return self.engine.crypt(self.clear_message)
+
+    @cached_property
+    def text(self) -> CodeText:
+        """
+        Codes of the encrypted message, converted on first access
+        :return code text:
+        """
+        return CodeText.from_text(self.message)
+
+    @cached_property
+    def clear_message(self) -> str:
+        """
+        Clear message, decrypted on first access
+        :return clear message:
+        """
+        return self.get_clear()
 
     def get_rotors(self):
         return self.rotors
@@ -379,22 +942,60 @@ class Enigma:
         """
         return [rotate(li, init_config[index]) for index, li in enumerate(rt.get_rotors(choosen_rotors))]
 
-    def decrypt(self) -> str:
-        unencrypted_message = []
-        for index, letter in enumerate(self.message):
-            rotors = self.get_rotors()
-            r0, r1, r2 = index % 256, index // 256 % 256, (index // 256) // 256 % 256
-            rotor0, rotor1, rotor2 = rotate(rotors[0], r0), rotate(rotors[1], r1), rotate(rotors[2], r2)
-            unencrypted_letter = chr(
-                rotor0.index((r0 + rotor1.index((r1 + rotor2.index((ord(letter) + r2) % 256)) % 256)) % 256))
-            unencrypted_message.append(unencrypted_letter)
-            # Log
-            # print(f'Rotors positions:\n0:{rotor0}\n1:{rotor1}\n2:{rotor2}\n')
-            # print(f'Rotors Rotation:\n{[r0,r1,r2]}')
-            # print(f'Translation:\n{[letter]} -> {[unencrypted_letter]} ({ord(letter)}>{rotor2.index(ord(letter))}>{rotor1.index(rotor2.index(ord(letter)))}>{rotor0.index(rotor1.index(rotor2.index(ord(letter))))})')
-            # print(f'\n-----\n')
+    @staticmethod
+    def decrypt_batch(message, configs, start: int = 0) -> np.ndarray:
+        """
+        Decrypt a message slice under many keys at once
+        A key is [rotor0, rotor1, rotor2, offset0, offset1, offset2], the offsets being added to the
+        char index as in enigma_force
+        :param message:
+        :param configs: (N, 6) integer array of keys
+        :param start: index of the slice's first char in the whole message
+        :return (N, len(message)) uint8 array of unencrypted codes:
+        """
+        configs = np.asarray(configs, dtype=np.int64).reshape(-1, 6)
+        bases, offsets = configs[:, :3] * 256, configs[:, 3:]
+        unencrypted_message = np.empty((len(configs), len(message)), dtype=np.uint8)
+        for j, code in enumerate(CodeText.from_text(message).codes.tolist()):
+            unencrypted_message[:, j] = decrypt_keys(code, start + j, bases, offsets)
         return unencrypted_message
 
+    @staticmethod
+    def filter_batch(message, configs, predicates: list, start: int = 0, counts: list = None) -> np.ndarray:
+        """
+        Decrypt a message slice under many keys char by char, dropping a key at its first rejected char
+        :param message:
+        :param configs: (N, 6) integer array of keys, as in decrypt_batch
+        :param predicates:
+        :param start: index of the slice's first char in the whole message
+        :param counts: list the number of keys left after each char is appended to
+        :return indexes of the keys accepted by every predicate:
+        """
+        configs = np.asarray(configs, dtype=np.int64).reshape(-1, 6)
+        bases, offsets, survivors = configs[:, :3] * 256, configs[:, 3:], np.arange(len(configs))
+        for predicate in predicates:
+            predicate.reset(len(configs))
+        for index, code in enumerate(CodeText.from_text(message).codes.tolist(), start):
+            codes = decrypt_keys(code, index, bases, offsets)
+            mask = np.ones(len(codes), dtype=bool)
+            for predicate in predicates:
+                mask &= predicate.check(index, codes)
+            for predicate in predicates:
+                predicate.keep(mask)
+            bases, offsets, survivors = bases[mask], offsets[mask], survivors[mask]
+            if counts is not None:
+                counts.append(len(survivors))
+            if not len(survivors):
+                break
+        return survivors
+
+    def decrypt(self) -> str:
+        """
+        Decrypt the message with the rotor engine
+        :return unencrypted message:
+        """
+        return self.engine.decrypt(self.text)
+
     def oldCrypt(self) -> list:  # Obsolete
         encrypted_message = []
         print(f'Rotors\n{self.rotors[0]}\n{self.rotors[1]}\n{self.rotors[2]}\n')
@@ -407,20 +1008,12 @@ class Enigma:
             print(f'Rotors\n{self.rotors[0]}\n{self.rotors[1]}\n{self.rotors[2]}\n')
         return encrypted_message
 
-    def crypt(self) -> list:
-        encrypted_message = []
-        for index, letter in enumerate(self.message):
-            rotors = self.get_rotors()
-            r0, r1, r2 = index % 256, index // 256 % 256, (index // 256) // 256 % 256
-            rotor0, rotor1, rotor2 = rotate(rotors[0], r0), rotate(rotors[1], r1), rotate(rotors[2], r2)
-            encrypted_letter = chr(rotor2[rotor1[rotor0[ord(letter)] - r0] - r1] - r2)
-            encrypted_message.append(encrypted_letter)
-            # Log
-            # print(f'Rotors positions:\n0:{rotor0}\n1:{rotor1}\n2:{rotor2}\n')
-            # print(f'Rotors Rotation:\n{[r0,r1,r2]}')
-            # print(f'Translation:\n{[letter]} -> {[encrypted_letter]} ({ord(letter)}>{rotor0[ord(letter)]-r0}>{rotor1[rotor0[ord(letter)]-r0]-r1}>{rotor2[rotor1[rotor0[ord(letter)]-r0]-r1]-r2})')
-            # print(f'\n-----\n')
-        return encrypted_message
+    def crypt(self) -> str:
+        """
+        Crypt the message with the rotor engine
+        :return encrypted message:
+        """
+        return self.engine.crypt(self.text)
 
     def get_clear(self) -> str:
         """
@@ -429,47 +1022,563 @@ class Enigma:
         """
         if self.encrypted:
             return self.decrypt()
-        else:
-            initial_message = self.message
-            self.message = self.crypt()
-            return initial_message
+        return self.clear_message
 
+    def get_clear_slice(self, start: int = 0, stop: int = None) -> str:
+        """
+        Get a slice of the clear message, only decrypting the chars it is made of
+        The rotor positions only depend on the char index, so a suffix costs as much as its length
+        :param start:
+        :param stop:
+        :return clear message slice:
+        """
+        if not self.encrypted or 'clear_message' in self.__dict__:
+            return self.clear_message[start:stop]
+        start, stop, step = slice(start, stop).indices(len(self.message))
+        return self.engine.decrypt(self.text[start:stop], start)
 
-def get_combi(part_i):
-    combi1 = list(permutations(range(8), 3))
-    combi2 = list(permutations(range(256), 3))
-    if 1000*(part_i+1) > len(combi2):
-        A = [combi1, combi2[1000 * part_i: len(combi2)]]
-    else:
-        A = [combi1, combi2[1000*part_i:1000*(part_i+1)]]
-    combi = list(product(*A))
-    return combi
-
-
-def enigma_force(message):
-    last4char = message[-4:]
-    for part_i in trange(16778): # stoped at 1924 still not conclusion
-        combis = get_combi(part_i=part_i)
-        rotors_data = rt.get_rotors(getsAll=True)
-        for combination in tqdm(combis):
-            unencrypted_message = []
-            rotors = [rotors_data[i] for i in combination[0]]
-            for index, letter in enumerate(last4char):
-                index += len(message)-4
-                r0, r1, r2 = (index + combination[1][0]) % 256, (index + combination[1][1]) // 256 % 256, (
-                        (index + combination[1][2]) // 256) // 256 % 256
-                rotor0, rotor1, rotor2 = rotate(rotors[0], r0), rotate(rotors[1], r1), rotate(rotors[2], r2)
-                unencrypted_letter = chr(
-                    rotor0.index((r0 + rotor1.index((r1 + rotor2.index((ord(letter) + r2) % 256)) % 256)) % 256))
-                unencrypted_message.append(unencrypted_letter)
-            if unencrypted_message == ['J', 'o', 'e', 'l']:
-                return combination
-
-
-def calculus(truc):  # For multithreading purpose, not functional yet
-    enigm = Enigma(messages['message8'], ch_rotors=truc[0], init_config=truc[1], encrypted=True)
+    @staticmethod
+    def encrypt_file(source: str, destination: str, ch_rotors: list = None, init_config: list = None,
+                     encoding: str = 'latin-1', chunk_size: int = 1 << 20, workers: int = 1):
+        """
+        Crypt a file chunk by chunk, see crypt_file
+        :param source:
+        :param destination:
+        :param ch_rotors:
+        :param init_config:
+        :param encoding:
+        :param chunk_size: number of chars per chunk
+        :param workers: number of worker processes
+        """
+        crypt_file(source, destination, ch_rotors, init_config, False, encoding, chunk_size, workers)
+
+    @staticmethod
+    def decrypt_file(source: str, destination: str, ch_rotors: list = None, init_config: list = None,
+                     encoding: str = 'latin-1', chunk_size: int = 1 << 20, workers: int = 1):
+        """
+        Decrypt a file chunk by chunk, see crypt_file
+        :param source:
+        :param destination:
+        :param ch_rotors:
+        :param init_config:
+        :param encoding:
+        :param chunk_size: number of chars per chunk
+        :param workers: number of worker processes
+        """
+        crypt_file(source, destination, ch_rotors, init_config, True, encoding, chunk_size, workers)
+
+    @staticmethod
+    def decrypt_range(path: str, start: int, stop: int, ch_rotors: list = None, init_config: list = None,
+                      encoding: str = 'latin-1') -> str:
+        """
+        Decrypt the bytes [start, stop) of a file without decrypting the rest of it
+        In latin-1 a byte is a char, in utf-8 the index of the first char is counted from the bytes
+        starting a char, so start and stop must not split a char
+        :param path:
+        :param start:
+        :param stop:
+        :param ch_rotors:
+        :param init_config:
+        :param encoding: 'latin-1' or 'utf-8'
+        :return unencrypted text, empty for an empty range:
+        """
+        if not is_latin1(encoding) and codecs.lookup(encoding).name != 'utf-8':
+            raise ValueError(f'Byte ranges can only be decrypted in latin-1 or utf-8, not {encoding}')
+        engine = RotorEngine([0, 1, 2] if ch_rotors is None else ch_rotors, init_config)
+        with open(path, 'rb') as file:
+            start, stop, step = slice(start, stop).indices(os.fstat(file.fileno()).st_size)
+            # an empty file cannot be mapped
+            if start >= stop:
+                return ''
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if is_latin1(encoding):
+                    index, text = start, data[start:stop].decode('latin-1')
+                else:
+                    index, text = count_utf8_chars(data, start), data[start:stop].decode('utf-8')
+        return engine.decrypt(text, index)
+
+
+def is_latin1(encoding: str) -> bool:
+    """
+    Check if an encoding stores every char below 256 as a single byte of the same value
+    :param encoding:
+    :return whether the encoding is latin-1:
+    """
+    return codecs.lookup(encoding).name == 'iso8859-1'
+
+
+def count_utf8_chars(data, stop: int, block: int = 1 << 24) -> int:
+    """
+    Count the utf-8 chars starting in the first bytes of a buffer, block by block
+    :param data: buffer of utf-8 bytes
+    :param stop: number of bytes looked at
+    :param block: number of bytes counted at once
+    :return number of chars:
+    """
+    count = 0
+    for begin in range(0, stop, block):
+        chunk = np.frombuffer(data, dtype=np.uint8, count=min(block, stop - begin), offset=begin)
+        count += int(np.count_nonzero((chunk & 0xC0) != 0x80))
+    return count
+
+
+def read_chunks(path: str, encoding: str = 'latin-1', chunk_size: int = 1 << 20):
+    """
+    Lazily read a file chunk by chunk, a latin-1 file being memory-mapped
+    :param path:
+    :param encoding:
+    :param chunk_size: number of chars per chunk
+    :return generator of (index of the first char, chunk codes as bytes):
+    """
+    if is_latin1(encoding):
+        if not os.path.getsize(path):
+            return
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start in range(0, len(data), chunk_size):
+                yield start, data[start:start + chunk_size]
+        return
+    with open(path, 'r', encoding=encoding, newline='') as file:
+        start, chunk = 0, file.read(chunk_size)
+        while chunk:
+            yield start, chunk.encode('latin-1')
+            start, chunk = start + len(chunk), file.read(chunk_size)
+
+
+def crypt_chunk(job: tuple) -> bytes:
+    """
+    Crypt or decrypt one chunk of a file
+    :param job: (rotors, init_config, chunk codes, index of the chunk's first char, whether to decrypt)
+    :return crypted or decrypted codes:
+    """
+    ch_rotors, init_config, chunk, start, decrypt = job
+    engine, codes = RotorEngine(ch_rotors, init_config), np.frombuffer(chunk, dtype=np.uint8)
+    return (engine.decrypt_codes(codes, start) if decrypt else engine.crypt_codes(codes, start)).tobytes()
+
+
+def crypt_file(source: str, destination: str, ch_rotors: list = None, init_config: list = None,
+               decrypt: bool = True, encoding: str = 'latin-1', chunk_size: int = 1 << 20, workers: int = 1):
+    """
+    Crypt or decrypt a file with enigma, chunk by chunk
+    Every chunk is processed on its own from the index of its first char, by worker processes when
+    there are several, and written in order, so only a few chunks are in memory at once
+    :param source:
+    :param destination:
+    :param ch_rotors:
+    :param init_config:
+    :param decrypt:
+    :param encoding: encoding of both files, every char must be below 256
+    :param chunk_size: number of chars per chunk
+    :param workers: number of worker processes
+    """
+    ch_rotors = [0, 1, 2] if ch_rotors is None else list(ch_rotors)
+    chunks = read_chunks(source, encoding, chunk_size)
+    jobs = ((ch_rotors, init_config, chunk, start, decrypt) for start, chunk in chunks)
+    with open(destination, 'w', encoding=encoding, newline='') as output:
+        if workers <= 1:
+            for job in jobs:
+                output.write(crypt_chunk(job).decode('latin-1'))
+            return
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque(pool.submit(crypt_chunk, job) for job in islice(jobs, workers * 2))
+            while pending:
+                output.write(pending.popleft().result().decode('latin-1'))
+                pending.extend(pool.submit(crypt_chunk, job) for job in islice(jobs, 1))
+
+
+def read_checkpoint(path: str, header: str = None) -> set:
+    """
+    Read the shards already completed from a checkpoint file
+    :param path:
+    :param header: first line of the file, naming the search it belongs to
+    :return set of completed shard ids:
+    """
+    if path is None or not os.path.exists(path) or not os.path.getsize(path):
+        return set()
+    with open(path, 'r', encoding="utf8") as file:
+        if header is not None and file.readline().rstrip('\n') != header:
+            raise ValueError(f'Checkpoint {path} belongs to another search, remove it or use another file')
+        return {int(line) for line in file if line.strip()}
+
+
+def open_checkpoint(path: str, header: str):
+    """
+    Open a checkpoint file to append completed shard ids, writing its header if it is new
+    :param path:
+    :param header:
+    :return file:
+    """
+    log = open(path, 'a', encoding="utf8")
+    if not log.tell():
+        log.write(f'{header}\n')
+        log.flush()
+    return log
+
+
+force_context = {}
+
+
+def init_force_worker(tail: str, start: int, crib: str, keyspace: Keyspace, stop_event=None,
+                      profile_shard: int = None, flush_interval: float = 5.0):
+    """
+    Set the context shared by every shard tested in a worker
+    :param tail: ciphertext slice the crib is compared with
+    :param start: index of the tail in the whole message
+    :param crib:
+    :param keyspace:
+    :param stop_event: set once any worker found the crib
+    :param profile_shard: shard run under cProfile, its stats going to force_shard_<id>.prof
+    :param flush_interval: minimal number of seconds between two flushes of the worker's counters
+    """
+    force_context.update(tail=tail, start=start, predicates=[Crib(crib, start)], stop_event=stop_event,
+                         keyspace=keyspace, profile_shard=profile_shard, counters=Counters(flush_interval))
+
+
+def force_shard(shard_id: int) -> tuple:
+    """
+    Test every key of a shard against the crib
+    The worker's counters are handed over with the result once every flush interval
+    :param shard_id:
+    :return shard id, matching key or None, whether the shard was fully tested and (worker, counters) or None:
+    """
+    stop_event, keyspace = force_context['stop_event'], force_context['keyspace']
+    if stop_event is not None and stop_event.is_set():
+        return shard_id, None, False, None
+    if shard_id == force_context['profile_shard']:
+        force_context['profile_shard'] = None
+        return profile_call(f'force_shard_{shard_id}.prof', force_shard, shard_id)
+    counters, counts = force_context['counters'], []
+    with counters.timer('keyspace_seconds'):
+        configs = keyspace.shard_block(shard_id)
+    with counters.timer('decrypt_seconds'):
+        found = Enigma.filter_batch(force_context['tail'], configs, force_context['predicates'],
+                                    force_context['start'], counts)
+    counters.add('shards')
+    counters.add('keys', len(configs))
+    for position, count in enumerate(counts, 1):
+        counters.add(f'survivors_{position}', count)
+    flushed = counters.flush(force=bool(found.size))
+    metrics = None if flushed is None else (os.getpid(), flushed)
+    if found.size:
+        return shard_id, keyspace.key(keyspace.shard(shard_id).start + int(found[0])), True, metrics
+    return shard_id, None, True, metrics
+
+
+def enigma_force(message, workers: int = 1, checkpoint: str = None, crib: str = 'Joel', dedupe: bool = True,
+                 metrics: str = None, profile_shard: int = None, report: bool = False, progress=None):
+    """
+    Brute force the rotors and offsets of an enigma message ending with a known crib
+    With dedupe, every key of the class of the key found gives the crib, the one returned is the key
+    of the class whose decryption of the rest of the message scores best, see resolve_class; offsets
+    which do not change the decryption, like offset 2 on less than 65280 chars, cannot be told apart
+    :param message:
+    :param workers: number of worker processes
+    :param checkpoint: file of completed shard ids, resumed from if it exists and was written by the same
+    search, a ValueError being raised otherwise
+    :param crib:
+    :param dedupe: test only one key per class of keys giving the same rotor positions on the crib
+    :param metrics: file the metrics are periodically exported to, as Prometheus text if it ends with .prom
+    :param profile_shard: shard run under cProfile, its stats going to force_shard_<id>.prof
+    :param report: print how much of the keyspace dedupe removes
+    :param progress: called with ('shards', shards done, number of shards) after each shard
+    :return (rotor order, offsets) or None:
+    """
+    full, start = Keyspace(nb_rotors=len(rt.registry)), len(message) - len(crib)
+    check_crib(message, crib, start)
+    keyspace = full
+    if dedupe:
+        keyspace = full.collapse(start, len(message))[0]
+        if report:
+            print(full.collapse_report(keyspace))
+    cache = get_cache()
+    search = make_key('enigma.force', str(message[-len(crib):]),
+                      {'start': start, 'crib': crib, 'dedupe': dedupe, 'shard_size': keyspace.shard_size})
+    known = cache.get(search)
+    if known is not None:
+        return None if known['key'] is None else tuple(map(tuple, known['key']))
+    shard_keys = [make_key('enigma.shard', search, {'shard': shard_id}) for shard_id in range(keyspace.nb_shards)]
+    header = f'# enigma_force {search}'
+    completed = read_checkpoint(checkpoint, header) | {shard_id for shard_id, shard_key in enumerate(shard_keys)
+                                               if shard_key in cache}
+    shards = [shard_id for shard_id in range(keyspace.nb_shards) if shard_id not in completed]
+    initargs = (message[-len(crib):], start, crib, keyspace)
+    log = open_checkpoint(checkpoint, header) if checkpoint is not None else None
+    bar = tqdm(total=keyspace.nb_shards, initial=len(completed))
+    collector = Collector(metrics, keyspace.nb_shards, len(completed))
+
+    def record(result) -> tuple:
+        shard_id, key, done, flushed = result
+        if flushed is not None:
+            collector.merge(*flushed)
+        if done:
+            bar.update()
+            collector.update()
+            if progress is not None:
+                progress('shards', collector.done, keyspace.nb_shards)
+            if key is None:
+                cache.set(shard_keys[shard_id], True)
+            if log is not None and key is None:
+                log.write(f'{shard_id}\n')
+                log.flush()
+        if key is not None:
+            if dedupe:
+                key = key[0], resolve_class(message, key[0], full.expand(key[1], start, len(message)))
+            cache.set(search, {'key': key})
+        return key
+
+    try:
+        if workers <= 1:
+            init_force_worker(*initargs, None, profile_shard)
+            for shard_id in shards:
+                key = record(force_shard(shard_id))
+                if key is not None:
+                    return key
+            cache.set(search, {'key': None})
+            return None
+        stop_event = Event()
+        shards = iter(shards)
+        with ProcessPoolExecutor(workers, initializer=init_force_worker,
+                                 initargs=initargs + (stop_event, profile_shard)) as pool:
+            pending = {pool.submit(force_shard, shard_id) for shard_id in islice(shards, workers * 4)}
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key = record(future.result())
+                    if key is not None:
+                        stop_event.set()
+                        pool.shutdown(cancel_futures=True)
+                        return key
+                pending |= {pool.submit(force_shard, shard_id) for shard_id in islice(shards, len(finished))}
+        cache.set(search, {'key': None})
+        return None
+    finally:
+        bar.close()
+        if workers <= 1 and 'counters' in force_context:
+            collector.merge(os.getpid(), force_context['counters'].flush(force=True))
+        if metrics is not None:
+            collector.export()
+        if log is not None:
+            log.close()
+
+
+def check_crib(message, crib: str, position: int):
+    """
+    Check that a crib is a part of a message the attacks can use
+    :param message:
+    :param crib:
+    :param position: index of the crib in the message
+    """
+    if not crib:
+        raise ValueError('The crib must not be empty')
+    if len(crib) > len(message):
+        raise ValueError(f'The crib is longer than the message: {len(crib)} > {len(message)} chars')
+    if not 0 <= position <= len(message) - len(crib):
+        raise ValueError(f'The crib does not fit in the message at index {position}')
+
+
+def enigma_crib_attack(message, crib: str, position: int = None) -> list:
+    """
+    Meet-in-the-middle known plaintext attack on the keys of enigma_force
+    The crib fixes what leaves rotor 2 and what enters rotor 0 for each (rotor, offset), the two
+    partial mappings are then joined through every (rotor, offset) of rotor 1
+    :param message:
+    :param crib:
+    :param position: index of the crib in the message, the end of the message by default
+    :return list of (rotor order, offsets) whose decryption gives the crib:
+    """
+    if position is None:
+        position = len(message) - len(crib)
+    check_crib(message, crib, position)
+    forward, inverse = get_stacked_tables()
+    nb_rotors = len(forward) // 256
+    index = position + np.arange(len(crib))
+    codes = CodeText.from_text(message[position:position + len(crib)]).widen()
+    plain = CodeText.from_text(crib).widen()
+    rotor_ids, offsets = np.divmod(np.arange(nb_rotors * 256), 256)
+    shifted = index + offsets[:, None]
+    r0, r2 = shifted & 255, (shifted >> 16) & 255
+    base = rotor_ids[:, None] * 256
+    left = (inverse[base + ((codes + r2) & 255)] - r2) & 255
+    right = (forward[base + ((plain + r0) & 255)] - r0) & 255
+    weights = np.left_shift(np.uint64(1), np.arange(min(len(crib), 8), dtype=np.uint64) * np.uint64(8))
+    left_keys = (left[:, :8].astype(np.uint64) * weights).sum(axis=1)
+    order = np.argsort(left_keys)
+    sorted_keys = left_keys[order]
+    keys = []
+    for rotor1 in range(nb_rotors):
+        for offset1 in range(256):
+            r1 = ((index + offset1) >> 8) & 255
+            needed = (forward[rotor1 * 256 + ((right + r1) & 255)] - r1) & 255
+            needed_keys = (needed[:, :8].astype(np.uint64) * weights).sum(axis=1)
+            lows = np.searchsorted(sorted_keys, needed_keys, side='left')
+            highs = np.searchsorted(sorted_keys, needed_keys, side='right')
+            for q in np.flatnonzero(highs > lows):
+                for l in order[lows[q]:highs[q]]:
+                    key = (int(rotor_ids[q]), rotor1, int(rotor_ids[l])), (int(offsets[q]), offset1, int(offsets[l]))
+                    if len(set(key[0])) == 3 and len(set(key[1])) == 3 and (left[l] == needed[q]).all():
+                        keys.append(key)
+    return keys
+
+
+def rank_rotor_orders(message, sample: int = 16384, progress=None) -> list:
+    """
+    Rank the rotor orders of enigma_force by the index of coincidence of the message once rotors 2
+    and 1 are peeled off: with the right rotors and offset 1, rotor 0 is a simple substitution on each
+    column of period 256 and keeps the coincidences of the clear text
+    Offset 2 does not move rotor 2 on the first 65280 chars, so the sample does not depend on it
+    :param message:
+    :param sample: number of chars used
+    :param progress: called with ('rotor_orders', rotors 2 done, number of rotors) after each rotor 2
+    :return list of (index of coincidence, rotor order, offset 1), best first:
+    """
+    forward, inverse = get_stacked_tables()
+    nb_rotors = len(inverse) // 256
+    codes = CodeText.from_text(message[:sample]).widen() & 255
+    index = np.arange(len(codes))
+    columns = index % 256 * 256
+    r2 = (index >> 16) & 255
+    ranking = []
+    for rotor2 in range(nb_rotors):
+        peeled = (inverse[rotor2 * 256 + ((codes + r2) & 255)] - r2) & 255
+        for rotor1 in range(nb_rotors):
+            if rotor1 == rotor2:
+                continue
+            best = (0, 0)
+            for offset1 in range(256):
+                r1 = ((index + offset1) >> 8) & 255
+                counts = np.bincount(columns + ((inverse[rotor1 * 256 + ((peeled + r1) & 255)] - r1) & 255),
+                                     minlength=256 * 256)
+                best = max(best, ((counts * (counts - 1)).sum(), offset1))
+            ioc = float(best[0] / max(1, len(codes) * (len(codes) / 256 - 1)))
+            ranking += [(ioc, (rotor0, rotor1, rotor2), best[1]) for rotor0 in range(nb_rotors)
+                        if rotor0 not in (rotor1, rotor2)]
+        if progress is not None:
+            progress('rotor_orders', rotor2 + 1, nb_rotors)
+    return sorted(ranking, key=lambda rank: -rank[0])
+
+
+def turn_windows(length: int, sample: int = 400) -> list:
+    """
+    Get the slices of a message telling the offsets apart: its beginning, where rotor 1 turns for the
+    first time, and the chars around each turn of rotor 2
+    :param length: message length
+    :param sample: number of chars at the beginning of the message
+    :return list of (start, stop):
+    """
+    return [(0, sample)] + [(turn - 256, turn + 64) for turn in range(65536, length, 65536)]
+
+
+def resolve_class(message, order: tuple, candidates: np.ndarray, sample: int = 400, batch_size: int = 4096) -> tuple:
+    """
+    Pick the offsets of a class of enigma_force whose decryption scores best with the french model
+    The keys of a class only give the same rotor positions on the crib, elsewhere their offsets 1 and 2
+    move the turns of rotors 1 and 2
+    :param message:
+    :param order: rotor order
+    :param candidates: (N, 3) offsets of the class, see Keyspace.expand
+    :param sample: number of chars scored at the beginning of the message
+    :param batch_size: number of candidates decrypted at once
+    :return offsets, the first best candidate:
+    """
+    text, scorer, windows = CodeText.from_text(message), get_french_scorer(), turn_windows(len(message), sample)
+    best_score, best = -np.inf, tuple(candidates[0].tolist())
+    for i in range(0, len(candidates), batch_size):
+        batch = candidates[i:i + batch_size]
+        configs = np.column_stack([np.tile(order, (len(batch), 1)), batch])
+        scores = sum(scorer.score(Enigma.decrypt_batch(text[start:stop], configs, start))
+                     for start, stop in windows)
+        if scores.max() > best_score:
+            best_score, best = float(scores.max()), tuple(batch[scores.argmax()].tolist())
+    return best
+
+
+def hill_climb(message, order: tuple, offsets: tuple, sample: int = 400) -> tuple:
+    """
+    Hill climb over the offsets of a rotor order with the french model
+    Each step tries every value of one offset at once and keeps the best, until nothing improves
+    The chars around each turn of rotor 2 are scored too so that offset 2 can be found
+    :param message:
+    :param order:
+    :param offsets: starting offsets
+    :param sample: number of chars scored at the beginning of the message
+    :return (score, offsets):
+    """
+    text, scorer = CodeText.from_text(message), get_french_scorer()
+    windows = turn_windows(len(message), sample)
+    offsets, best_score, improved = list(offsets), -np.inf, True
+    while improved:
+        improved = False
+        for level in random.sample(range(3), 3):
+            configs = np.tile(list(order) + offsets, (256, 1))
+            configs[:, 3 + level] = np.arange(256)
+            scores = sum(scorer.score(Enigma.decrypt_batch(text[start:stop], configs, start))
+                         for start, stop in windows)
+            if scores.max() > best_score:
+                best_score, offsets[level], improved = float(scores.max()), int(scores.argmax()), True
+    return best_score, tuple(offsets)
+
+
+def climb_job(job: tuple) -> tuple:
+    """
+    Run one hill climbing restart
+    :param job: (message, order, starting offsets, seed)
+    :return (score, order, offsets):
+    """
+    message, order, offsets, seed = job
+    random.seed(seed)
+    score, offsets = hill_climb(message, order, offsets)
+    return score, order, offsets
+
+
+def enigma_statistical_attack(message, workers: int = 1, nb_orders: int = 12, restarts: int = 4,
+                              seed: int = 0, progress=None) -> tuple:
+    """
+    Ciphertext only attack on the keys of enigma_force: the rotor orders are ranked by index of
+    coincidence, then the offsets of the best ones are hill climbed from random restarts
+    :param message:
+    :param workers: number of worker processes running the restarts
+    :param nb_orders: number of rotor orders hill climbed
+    :param restarts: number of restarts per rotor order
+    :param seed:
+    :param progress: called with (stage, done, total) while the rotor orders are ranked and climbed
+    :return (score, rotor order, offsets) of the best key found:
+    """
+    params = {'nb_orders': nb_orders, 'restarts': restarts, 'seed': seed}
+    score, order, offsets = get_cache().cached('enigma.statistical', message, params, lambda: search_statistical(
+        message, workers, nb_orders, restarts, seed, progress))
+    return score, tuple(order), tuple(offsets)
+
+
+def search_statistical(message, workers: int = 1, nb_orders: int = 12, restarts: int = 4, seed: int = 0,
+                       progress=None) -> tuple:
+    """
+    Run the restarts of enigma_statistical_attack
+    :param message:
+    :param workers:
+    :param nb_orders:
+    :param restarts:
+    :param seed:
+    :param progress:
+    :return (score, rotor order, offsets) of the best key found:
+    """
+    generator, text = random.Random(seed), CodeText.from_text(message)
+    jobs = [(text, order, (generator.randrange(256), offset1, generator.randrange(256)), generator.random())
+            for ioc, order, offset1 in rank_rotor_orders(text, progress=progress)[:nb_orders]
+            for restart in range(restarts)]
+    results = []
+    with ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+        for result in map(climb_job, jobs) if pool is None else pool.map(climb_job, jobs):
+            results.append(result)
+            if progress is not None:
+                progress('restarts', len(results), len(jobs))
+    return max(results)
+
+
+def calculus(truc):
+    message = messages['message8']
+    start = len(message) - 4
     print(f'Testing for {truc}')
-    if enigm.clear_message[-4:] == ['J', 'o', 'ë', 'l']:
+    engine = RotorEngine(truc[0], init_config=truc[1])
+    if engine.decrypt_checked(message[start:], [Crib('Joël', start)], start) is not None:
         print(f'Eureka !\n Combi : {truc}')
 
 
@@ -499,8 +1608,7 @@ if __name__ == '__main__':
     # all_combi_size = len(all_combi)
     # for combi in tqdm(all_combi, desc="Advancement"):
     #     message8 = Enigma(messages['message8'], ch_rotors=combi[0], init_config=combi[1], encrypted=True)
-    #     if message8.clear_message[-4:] == ['J', 'o', 'ë', 'l']:
+    #     if message8.clear_message[-4:] == 'Joël':
     #         print(f'Eureka !\n Combi : {combi}')
-    print(enigma_force(messages["message8"]))
-    # pool = ThreadPool(40)
-    # results = pool.map(calculus, all_combi)
+    print(enigma_force(messages["message8"], workers=os.cpu_count(), checkpoint='enigma_force.checkpoint',
+                       metrics='enigma_force.metrics.json', report=True))
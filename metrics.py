@@ -0,0 +1,175 @@
+"""
+Give the low overhead metrics of the long brute force runs
+Workers add to local counters and only hand them over every few seconds, the collector merges them
+per worker and periodically exports them as JSON or Prometheus text
+"""
+
+import os
+import json
+import time
+import cProfile
+from contextlib import contextmanager
+
+
+class Counters:
+
+    def __init__(self, interval: float = 5.0):
+        """
+        Init
+        :param interval: minimal number of seconds between two flushes
+        """
+        self.interval = interval
+        self.values = {}
+        self.last_flush = time.perf_counter()
+
+    def add(self, name: str, value: float = 1):
+        """
+        Add to a counter
+        :param name:
+        :param value:
+        """
+        self.values[name] = self.values.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Add the seconds spent in a block to a counter
+        :param name:
+        """
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - begin)
+
+    def flush(self, force: bool = False):
+        """
+        Hand over the counters added since the last flush, if the interval is over
+        :param force: flush even if the interval is not over
+        :return dictionary of counters or None:
+        """
+        now = time.perf_counter()
+        if not force and now - self.last_flush < self.interval:
+            return None
+        values, self.values, self.last_flush = self.values, {}, now
+        return values
+
+
+class Collector:
+
+    def __init__(self, path: str = None, total: int = 0, done: int = 0, interval: float = 10.0,
+                 prefix: str = 'enigma_force'):
+        """
+        Init
+        :param path: export file, Prometheus text if it ends with .prom and JSON otherwise
+        :param total: number of shards of the run
+        :param done: number of shards already done before the run, from a checkpoint
+        :param interval: minimal number of seconds between two exports
+        :param prefix: prefix of the Prometheus metrics
+        """
+        self.path = path
+        self.total = total
+        self.done = done
+        self.initial = done
+        self.interval = interval
+        self.prefix = prefix
+        self.workers = {}
+        self.start = time.perf_counter()
+        self.last_export = self.start
+
+    def merge(self, worker, values: dict):
+        """
+        Merge counters flushed by a worker
+        :param worker: worker id
+        :param values:
+        """
+        counters = self.workers.setdefault(str(worker), {})
+        for name, value in values.items():
+            counters[name] = counters.get(name, 0) + value
+
+    def update(self, shards: int = 1):
+        """
+        Count completed shards and export if the interval is over
+        :param shards:
+        """
+        self.done += shards
+        if self.path is not None and time.perf_counter() - self.last_export >= self.interval:
+            self.export()
+
+    def summary(self) -> dict:
+        """
+        Get the metrics of the run
+        :return dictionary of metrics:
+        """
+        elapsed = time.perf_counter() - self.start
+        rate = (self.done - self.initial) / elapsed if elapsed else 0
+        totals = {}
+        for counters in self.workers.values():
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+        workers = {}
+        for worker, counters in self.workers.items():
+            busy = counters.get('keyspace_seconds', 0) + counters.get('decrypt_seconds', 0)
+            workers[worker] = dict(counters, keys_per_second=counters.get('keys', 0) / busy if busy else 0)
+        keys = totals.get('keys', 0)
+        pruning = {name: 1 - value / keys for name, value in sorted(totals.items())
+                   if name.startswith('survivors_') and keys}
+        return {'elapsed_seconds': elapsed,
+                'shards_done': self.done,
+                'shards_total': self.total,
+                'shards_per_second': rate,
+                'eta_seconds': (self.total - self.done) / rate if rate else None,
+                'keys_per_second': keys / elapsed if elapsed else 0,
+                'pruned_after': pruning,
+                'totals': totals,
+                'workers': workers}
+
+    def prometheus(self, summary: dict) -> str:
+        """
+        Format a summary as Prometheus text
+        :param summary:
+        :return text:
+        """
+        lines = []
+        for name in ('elapsed_seconds', 'shards_done', 'shards_total', 'shards_per_second', 'eta_seconds',
+                     'keys_per_second'):
+            if summary[name] is not None:
+                lines += [f'# TYPE {self.prefix}_{name} gauge', f'{self.prefix}_{name} {summary[name]}']
+        lines.append(f'# TYPE {self.prefix}_pruned_ratio gauge')
+        lines += [f'{self.prefix}_pruned_ratio{{after="{name[len("survivors_"):]}"}} {value}'
+                  for name, value in summary['pruned_after'].items()]
+        names = sorted({name for counters in summary['workers'].values() for name in counters})
+        for name in names:
+            lines.append(f'# TYPE {self.prefix}_worker_{name} gauge')
+            lines += [f'{self.prefix}_worker_{name}{{worker="{worker}"}} {counters[name]}'
+                      for worker, counters in summary['workers'].items() if name in counters]
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        """
+        Write the summary to the export file, replacing it at once
+        """
+        summary = self.summary()
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding="utf8") as file:
+            if self.path.endswith('.prom'):
+                file.write(self.prometheus(summary))
+            else:
+                json.dump(summary, file, indent=1)
+        os.replace(temporary, self.path)
+        self.last_export = time.perf_counter()
+
+
+def profile_call(path: str, function, *args):
+    """
+    Run a function under cProfile and dump its stats, to be read with pstats
+    :param path: stats file
+    :param function:
+    :param args:
+    :return result of the function:
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        profiler.dump_stats(path)
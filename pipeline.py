@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+"""
+Batch auto-solve pipeline: every message of a directory is fingerprinted with cheap statistics, the
+matching cracker is run in a process pool and the results are written as JSON files
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from tqdm import tqdm
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from histogram import Histogram
+from text import CodeText
+from store import MessageStore
+from scoring import get_french_scorer
+from main import Scytale, Shift, Vigenere, RotorEngine, index_of_coincidence, enigma_statistical_attack, enigma_force
+
+FINGERPRINT_SAMPLE = 65536
+MAX_PERIOD = 40
+CLEAR_SCORE = -22
+# french texts full of symbols score down to -23, and a wrong key gives -28 to -30
+SOLVED_SCORE = -25
+FRENCH_IOC = 0.05
+UNIFORM_IOC = 2 / 256
+MAX_SCYTALE_COLUMNS = 1000
+
+"""
+Fingerprint
+"""
+
+
+def fingerprint(message: str, sample: int = FINGERPRINT_SAMPLE) -> dict:
+    """
+    Get the cheap statistics used to guess the cipher of a message from its first chars
+    :param message: str or CodeText
+    :param sample: number of chars looked at
+    :return dictionary of statistics:
+    """
+    codes = CodeText.from_text(message[:sample]).codes
+    if not len(codes):
+        return {'length': 0}
+    dense = np.unique(codes, return_inverse=True)[1]
+    iocs = {period: index_of_coincidence(dense, period)
+            for period in range(1, min(MAX_PERIOD, max(1, len(codes) // 20)) + 1)}
+    best = max(iocs.values())
+    period = min(period for period, ioc in iocs.items() if ioc >= 0.9 * best)
+    return {'length': len(message),
+            'min_code': int(codes.min()),
+            'max_code': int(codes.max()),
+            'nb_symbols': int(dense.max()) + 1,
+            'ioc': iocs[1],
+            'period': period,
+            'period_ioc': iocs[period],
+            'most_common': Histogram(np.bincount(codes)).most_common(),
+            'mean_score': get_french_scorer().score(codes) / len(codes)}
+
+
+def classify(stats: dict) -> str:
+    """
+    Guess the cipher of a message from its fingerprint
+    A transposition keeps the french chars distribution, a shift keeps its index of coincidence, a
+    Vigenere key gives it back on the columns of its length and enigma spreads the chars evenly over
+    the 256 symbols
+    :param stats: fingerprint of the message
+    :return 'empty', 'clear', 'scytale', 'shift', 'vigenere' or 'enigma':
+    """
+    if not stats['length']:
+        return 'empty'
+    if stats['mean_score'] >= CLEAR_SCORE:
+        return 'clear'
+    if stats['ioc'] >= FRENCH_IOC:
+        return 'scytale' if stats['most_common'] == ' ' else 'shift'
+    if stats['period_ioc'] >= FRENCH_IOC:
+        return 'vigenere'
+    if stats['max_code'] < 256 and stats['ioc'] < UNIFORM_IOC:
+        return 'enigma'
+    return 'vigenere'
+
+
+"""
+Crackers
+"""
+
+
+def crack_clear(message: str, progress=None) -> dict:
+    """
+    Keep a message already in clear
+    :param message:
+    :param progress: unused
+    :return key and clear message:
+    """
+    return {'key': None, 'clear': message}
+
+
+def crack_scytale(message: str, progress=None) -> dict:
+    """
+    Crack a scytale message by trying every number of columns
+    :param message:
+    :param progress: called with (stage, done, total) as the numbers of columns are scored
+    :return key and clear message:
+    """
+    score, nb_columns, clear = Scytale.crack(message, max_columns=min(MAX_SCYTALE_COLUMNS, len(message) // 2),
+                                             top=1, progress=progress)[0]
+    return {'key': nb_columns, 'clear': clear}
+
+
+def crack_shift(message: str, progress=None) -> dict:
+    """
+    Crack a shift message with the french scorer
+    :param message:
+    :param progress: unused
+    :return key and clear message:
+    """
+    cipher = Shift(message, encrypted=False)
+    shift = cipher.get_shift(message)
+    return {'key': shift, 'clear': cipher.decrypt(message, shift)}
+
+
+def crack_vigenere(message: str, progress=None) -> dict:
+    """
+    Crack a Vigenere message, key length then shifts
+    :param message:
+    :param progress: unused
+    :return key and clear message:
+    """
+    cipher = Vigenere(message)
+    return {'key': cipher.shifts, 'clear': cipher.clear_message}
+
+
+def crack_enigma(message: str, progress=None, crib: str = None) -> dict:
+    """
+    Crack an enigma message with the ciphertext only attack, or by brute force when the message is
+    known to end with a crib
+    :param message:
+    :param progress: called with (stage, done, total) as the search goes
+    :param crib:
+    :return key and clear message:
+    """
+    if crib is not None:
+        key = enigma_force(message, crib=crib, progress=progress)
+        if key is None:
+            raise ValueError(f'No key of the keyspace decrypts the end of the message into {crib!r}')
+        order, offsets = key
+    else:
+        score, order, offsets = enigma_statistical_attack(message, progress=progress)
+    clear = RotorEngine(order, index_offsets=offsets).decrypt(message)
+    return {'key': {'rotors': list(order), 'offsets': list(offsets)}, 'clear': clear}
+
+
+CRACKERS = {'clear': crack_clear, 'scytale': crack_scytale, 'shift': crack_shift, 'vigenere': crack_vigenere,
+            'enigma': crack_enigma}
+
+"""
+Decrypters
+"""
+
+
+def decrypt_scytale(message: str, key: int) -> str:
+    """
+    Decrypt a scytale message
+    :param message:
+    :param key: number of columns
+    :return clear message:
+    """
+    return Scytale(message, int(key)).clear_message
+
+
+def decrypt_shift(message: str, key: int) -> str:
+    """
+    Decrypt a shift message
+    :param message:
+    :param key: shift, as given by crack_shift
+    :return clear message:
+    """
+    return Shift(message, encrypted=False).decrypt(message, int(key))
+
+
+def decrypt_vigenere(message: str, key: list) -> str:
+    """
+    Decrypt a Vigenere message
+    :param message:
+    :param key: shift of each column, as given by crack_vigenere
+    :return clear message:
+    """
+    return Vigenere(message, shifts=[int(shift) for shift in key]).clear_message
+
+
+def decrypt_enigma(message: str, key: dict) -> str:
+    """
+    Decrypt an enigma message
+    :param message:
+    :param key: dictionary of rotors with init_config and/or offsets, as given by crack_enigma
+    :return clear message:
+    """
+    return RotorEngine(key['rotors'], key.get('init_config'), key.get('offsets')).decrypt(message)
+
+
+DECRYPTERS = {'scytale': decrypt_scytale, 'shift': decrypt_shift, 'vigenere': decrypt_vigenere,
+              'enigma': decrypt_enigma}
+
+"""
+Pipeline
+"""
+
+
+def score_result(result: dict) -> dict:
+    """
+    Score the clear message of a result, which is only solved when it reads as french: a cracker always
+    gives its best key, even when none of its keys fits the message
+    :param result: result with the clear message
+    :return result with its score and whether it is solved:
+    """
+    result['score'] = get_french_scorer().mean_score(result['clear'][:FINGERPRINT_SAMPLE])
+    result['solved'] = bool(result['score'] >= SOLVED_SCORE)
+    return result
+
+
+def solve(message) -> dict:
+    """
+    Fingerprint a message and run the matching cracker
+    :param message: str or CodeText
+    :return dictionary with the fingerprint, the cipher, the key, the clear message, its score and
+    whether it is solved:
+    """
+    stats = fingerprint(message)
+    cipher = classify(stats)
+    result = {'cipher': cipher, 'fingerprint': stats}
+    if cipher in CRACKERS:
+        result.update(CRACKERS[cipher](message))
+        score_result(result)
+    return result
+
+
+@lru_cache(maxsize=None)
+def get_store(directory: str, suffix: str) -> MessageStore:
+    """
+    Get the store of a messages directory, shared by the messages solved in this process
+    :param directory:
+    :param suffix: suffix of the message files
+    :return store:
+    """
+    return MessageStore(directory, suffix)
+
+
+def solve_file(path: str) -> dict:
+    """
+    Solve the message of a file, an error being reported in the result rather than raised
+    The message is read from the store of its directory, as codes sharing their pages with the other
+    workers, see MessageStore.codes
+    :param path:
+    :return result of solve with the file and the time taken:
+    """
+    begin = time.perf_counter()
+    try:
+        directory, file = os.path.split(os.path.abspath(path))
+        suffix = os.path.splitext(file)[1]
+        store, name = get_store(directory, suffix), file[:len(file) - len(suffix)]
+        if name not in store:
+            store.refresh()
+        result = solve(store.codes(name))
+    except Exception as error:
+        result = {'error': f'{type(error).__name__}: {error}'}
+    result.update(file=path, seconds=time.perf_counter() - begin)
+    return result
+
+
+def result_path(path: str, output: str) -> str:
+    """
+    Get the JSON file holding the result of a message
+    :param path:
+    :param output: results directory
+    :return path of the result:
+    """
+    return os.path.join(output, os.path.splitext(os.path.basename(path))[0] + '.json')
+
+
+def iter_messages(directory: str, output: str = None, suffix: str = '.txt'):
+    """
+    Lazily yield the message files of a directory, skipping the ones already solved in output
+    :param directory:
+    :param output: results directory
+    :param suffix:
+    :return generator of paths:
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(suffix):
+                if output is None or not os.path.exists(result_path(entry.path, output)):
+                    yield entry.path
+
+
+def write_result(result: dict, output: str):
+    """
+    Write the result of a message in the results directory
+    :param result:
+    :param output:
+    """
+    with open(result_path(result['file'], output), 'w', encoding="utf8") as file:
+        json.dump(result, file, ensure_ascii=False, indent=1)
+
+
+def solve_directory(directory: str, output: str = 'results', workers: int = None) -> dict:
+    """
+    Solve every message of a directory, one message per worker process at a time, the files being
+    listed lazily and the results written as soon as they are known
+    :param directory:
+    :param output: results directory, a message whose result is already there is skipped
+    :param workers: number of worker processes, every core by default
+    :return count of the messages solved per cipher, the ones whose clear message does not read as french
+    being counted as unsolved:
+    """
+    os.makedirs(output, exist_ok=True)
+    workers = workers or os.cpu_count()
+    paths, summary, progress = iter_messages(directory, output), {}, tqdm(unit='message')
+
+    def record(result: dict):
+        write_result(result, output)
+        cipher = 'unsolved' if result.get('solved') is False else result.get('cipher', 'error')
+        summary[cipher] = summary.get(cipher, 0) + 1
+        progress.update()
+
+    try:
+        if workers <= 1:
+            for path in paths:
+                record(solve_file(path))
+            return summary
+        with ProcessPoolExecutor(workers) as pool:
+            pending = {pool.submit(solve_file, path) for path in islice(paths, workers * 2)}
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(future.result())
+                pending |= {pool.submit(solve_file, path) for path in islice(paths, len(finished))}
+        return summary
+    finally:
+        progress.close()
+
+
+"""
+Main
+"""
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('directory', nargs='?', default='messages')
+    parser.add_argument('--output', default='results')
+    parser.add_argument('--workers', type=int, default=None)
+    arguments = parser.parse_args()
+    print(solve_directory(arguments.directory, arguments.output, arguments.workers), file=sys.stderr)
@@ -0,0 +1,133 @@
+"""
+Give the predicates used to reject wrong keys while decrypting char by char
+A predicate checks one decrypted char of one key with accepts, or of many keys at once with check
+"""
+
+import numpy as np
+
+
+class Predicate:
+
+    def reset(self, size: int = 1):
+        """
+        Forget what was seen for the previous candidates
+        :param size: number of candidates checked at once
+        """
+
+    def accepts(self, index: int, code: int) -> bool:
+        """
+        Check the decrypted char of a single candidate
+        :param index: index of the char in the whole message
+        :param code:
+        :return whether the candidate is still possible:
+        """
+        return True
+
+    def check(self, index: int, codes: np.ndarray) -> np.ndarray:
+        """
+        Check the decrypted char of many candidates
+        :param index: index of the char in the whole message
+        :param codes:
+        :return mask of the candidates still possible:
+        """
+        return np.ones(len(codes), dtype=bool)
+
+    def keep(self, mask: np.ndarray):
+        """
+        Only keep the state of the candidates still possible
+        :param mask:
+        """
+
+
+class Crib(Predicate):
+
+    def __init__(self, crib: str, position: int):
+        """
+        Init
+        :param crib:
+        :param position: index of the crib in the whole message
+        """
+        self.crib = [ord(letter) for letter in crib]
+        self.position = position
+
+    def accepts(self, index: int, code: int) -> bool:
+        offset = index - self.position
+        return not 0 <= offset < len(self.crib) or code == self.crib[offset]
+
+    def check(self, index: int, codes: np.ndarray) -> np.ndarray:
+        offset = index - self.position
+        if not 0 <= offset < len(self.crib):
+            return np.ones(len(codes), dtype=bool)
+        return codes == self.crib[offset]
+
+
+class Charset(Predicate):
+
+    def __init__(self, chars):
+        """
+        Init
+        :param chars: allowed chars, all below 256
+        """
+        self.allowed = np.zeros(256, dtype=bool)
+        self.allowed[[ord(letter) for letter in chars]] = True
+        self.allowed_list = self.allowed.tolist()
+
+    def accepts(self, index: int, code: int) -> bool:
+        return self.allowed_list[code]
+
+    def check(self, index: int, codes: np.ndarray) -> np.ndarray:
+        return self.allowed[codes]
+
+
+class Printable(Charset):
+
+    def __init__(self):
+        """
+        Init
+        """
+        super().__init__([chr(code) for code in range(256) if chr(code).isprintable() or chr(code) in '\n\r\t'])
+
+
+class Latin1Text(Charset):
+
+    def __init__(self):
+        """
+        Init
+        """
+        super().__init__([chr(code) for code in range(256)
+                          if chr(code).isalnum() or chr(code) in ' \n\r\t.,;:!?\'"-()«»'])
+
+
+class Frequency(Predicate):
+
+    def __init__(self, common: str = ' eaisnrtoludcmpEAISNRTOLUDCMPéèàç', threshold: float = 0.6, warmup: int = 16):
+        """
+        Init
+        :param common: chars making most of a clear text
+        :param threshold: minimal share of common chars
+        :param warmup: number of chars seen before the threshold is applied
+        """
+        self.common = Charset(common)
+        self.threshold = threshold
+        self.warmup = warmup
+        self.reset()
+
+    def reset(self, size: int = 1):
+        self.seen = 0
+        self.count = 0
+        self.counts = np.zeros(size, dtype=np.int64)
+
+    def accepts(self, index: int, code: int) -> bool:
+        self.seen += 1
+        self.count += self.common.allowed_list[code]
+        return self.seen < self.warmup or self.count >= self.threshold * self.seen
+
+    def check(self, index: int, codes: np.ndarray) -> np.ndarray:
+        self.seen += 1
+        self.counts += self.common.allowed[codes]
+        if self.seen < self.warmup:
+            return np.ones(len(codes), dtype=bool)
+        return self.counts >= self.threshold * self.seen
+
+    def keep(self, mask: np.ndarray):
+        self.counts = self.counts[mask]
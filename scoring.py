@@ -0,0 +1,210 @@
+"""
+Give the french language model used to score candidate clear texts
+N-grams log-probabilities are stored in a flat array indexed by the n-gram packed as an integer, so
+many candidates are scored at once with a single fancy indexing
+"""
+
+import os
+import hashlib
+import unicodedata
+import numpy as np
+from functools import lru_cache
+from text import CodeText, to_alphabet
+
+REFERENCE_FILES = ['french_corpus.txt']
+PUNCTUATION = '.,;:!?\'"-()«»'
+
+
+def read_reference() -> str:
+    """
+    Read the french corpus shipped with the project, kept apart from the clear texts of the messages
+    :return reference text:
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    texts = []
+    for name in REFERENCE_FILES:
+        with open(os.path.join(directory, name), 'r', encoding="utf8") as file:
+            texts.append(file.read())
+    return '\n'.join(texts)
+
+
+@lru_cache(maxsize=None)
+def reference_digest() -> str:
+    """
+    Get a digest of the french corpus, so that the cached results scored with it are dropped when it changes
+    :return hexadecimal digest:
+    """
+    return hashlib.sha256(read_reference().encode('utf8')).hexdigest()
+
+
+def synthetic_text(size: int) -> str:
+    """
+    Get a french clear text of a given size by repeating the reference texts, the chars above 255 becoming
+    spaces so that enigma can crypt it, for the benchmarks and the tests
+    :param size: number of chars
+    :return text:
+    """
+    codes = CodeText.from_text(read_reference()).codes
+    return str(CodeText(np.resize(np.where(codes < 256, codes, 32), size)))
+
+
+def get_identity_symbols() -> np.ndarray:
+    """
+    Get the symbols keeping every one of the 256 chars apart
+    :return array giving the symbol of each code:
+    """
+    return np.arange(256)
+
+
+def get_letter_symbols() -> np.ndarray:
+    """
+    Get symbols folding case and accents: 0 for rare chars, 1 for spaces, 2 for new lines, 3 for
+    digits, 4 to 29 for letters, then one symbol per common punctuation
+    :return array giving the symbol of each code:
+    """
+    symbols = np.zeros(256, dtype=np.int64)
+    for code in range(256):
+        letter = unicodedata.normalize('NFD', chr(code))[0].lower()
+        if 'a' <= letter <= 'z':
+            symbols[code] = 4 + ord(letter) - ord('a')
+        elif letter.isdigit():
+            symbols[code] = 3
+    symbols[[ord(' '), ord('\t')]] = 1
+    symbols[[ord('\n'), ord('\r')]] = 2
+    symbols[[ord(letter) for letter in PUNCTUATION]] = np.arange(30, 30 + len(PUNCTUATION))
+    return symbols
+
+
+class NgramModel:
+
+    def __init__(self, text: str, n: int = 4, symbols: np.ndarray = None, smoothing: float = 0.01):
+        """
+        Init
+        :param text: reference clear text, str or CodeText
+        :param n: size of the n-grams
+        :param symbols: symbol of each of the 256 codes, every code apart by default
+        :param smoothing: count given to the n-grams never seen
+        """
+        self.n = n
+        self.symbols = get_identity_symbols() if symbols is None else np.asarray(symbols, dtype=np.int64)
+        self.alphabet = int(self.symbols.max()) + 1
+        packed = self.pack(CodeText.from_text(text).symbols()[None, :])[0]
+        counts = np.bincount(packed, minlength=self.alphabet ** n) + smoothing
+        self.log_probs = np.log(counts / counts.sum()).astype(np.float32)
+
+    def pack(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Pack every n-gram of many texts as an integer
+        :param codes: (N, L) array of codes below 256
+        :return (N, L - n + 1) array of packed n-grams:
+        """
+        symbols = self.symbols[codes]
+        length = symbols.shape[-1] - self.n + 1
+        packed = np.zeros(symbols.shape[:-1] + (max(0, length),), dtype=np.int64)
+        for offset in range(self.n):
+            packed = packed * self.alphabet + symbols[..., offset:offset + length]
+        return packed
+
+    def score_range(self, codes: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """
+        Get the log-likelihood of the n-grams of many texts starting between two positions
+        :param codes: (N, L) array of codes below 256
+        :param start:
+        :param stop:
+        :return (N,) array of scores:
+        """
+        return self.log_probs[self.pack(codes[:, start:stop + self.n - 1])].sum(axis=-1, dtype=np.float64)
+
+    def score(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Get the log-likelihood of many texts
+        :param codes: (N, L) array of codes below 256
+        :return (N,) array of scores:
+        """
+        return self.score_range(codes, 0, codes.shape[-1])
+
+
+class Scorer:
+
+    def __init__(self, models: list):
+        """
+        Init
+        The score of a text is the sum of the log-likelihoods given by every model
+        :param models:
+        """
+        self.models = models
+
+    def score(self, codes: np.ndarray, threshold: float = None, step: int = 64):
+        """
+        Get the score of one or many texts given as arrays of codes
+        With a threshold, the texts are scored step chars at a time and a text whose mean score
+        per char falls below the threshold is dropped with a score of -inf
+        :param codes: (L,) or (N, L) array of codes, the ones outside the 256 symbols counting as rare chars,
+        see to_alphabet
+        :param threshold: minimal mean score per char
+        :param step: number of chars scored between two checks of the threshold
+        :return score or (N,) array of scores:
+        """
+        codes = to_alphabet(codes)
+        if codes.ndim == 1:
+            return float(self.score(codes[None, :], threshold, step)[0])
+        if threshold is None:
+            return sum(model.score(codes) for model in self.models)
+        scores, alive, length = np.zeros(len(codes)), np.arange(len(codes)), codes.shape[1]
+        for start in range(0, length, step):
+            stop = min(start + step, length)
+            scores[alive] += sum(model.score_range(codes[alive], start, stop) for model in self.models)
+            survivors = scores[alive] >= threshold * stop
+            scores[alive[~survivors]] = -np.inf
+            alive = alive[survivors]
+            if not len(alive):
+                break
+        return scores
+
+    def score_text(self, text) -> float:
+        """
+        Get the score of a text
+        :param text: str or CodeText
+        :return score:
+        """
+        return self.score(CodeText.from_text(text).codes)
+
+    def mean_score(self, text) -> float:
+        """
+        Get the mean score per char of a text, about -16 for french and -30 for random chars
+        :param text: str or CodeText
+        :return mean score:
+        """
+        return self.score_text(text) / max(1, len(text))
+
+
+@lru_cache(maxsize=None)
+def get_french_model(n: int) -> NgramModel:
+    """
+    Get a french n-grams model built from the reference texts, on letters for n > 2 and on the 256
+    symbols otherwise
+    :param n:
+    :return model:
+    """
+    symbols = get_letter_symbols() if n > 2 else None
+    return NgramModel(read_reference(), n=n, symbols=symbols)
+
+
+@lru_cache(maxsize=None)
+def get_french_scorer() -> Scorer:
+    """
+    Get the scorer shared by every cracker: quadgrams on letters and bigrams on the 256 symbols
+    :return scorer:
+    """
+    return Scorer([get_french_model(4), get_french_model(2)])
+
+
+@lru_cache(maxsize=None)
+def get_french_frequencies(smoothing: float = 0.01) -> np.ndarray:
+    """
+    Get the frequency of each of the 256 symbols in the reference texts
+    :param smoothing: count given to the symbols never seen
+    :return array of frequencies:
+    """
+    counts = np.bincount(CodeText.from_text(read_reference()).symbols(), minlength=256) + smoothing
+    return counts / counts.sum()
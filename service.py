@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local decryption service: decrypt, crack and solve jobs are posted over HTTP, on a TCP port or a unix
+socket, queued and each run in its own process, forked from the service which keeps the rotor tables
+and the n-gram models loaded, so that cancelling a job terminates its process
+The events and the progress of the jobs are streamed back as JSON lines
+
+    POST   /jobs[?stream=1]   {"action": "decrypt" | "crack" | "solve", "cipher": ..., "key": ..., "message": ...}
+                              with "crib" to brute force an enigma message ending with it
+    GET    /jobs              list the jobs
+    GET    /jobs/<id>         state of a job, with its result once done
+    GET    /jobs/<id>/events  stream the events of a job until it is over
+    DELETE /jobs/<id>         cancel a job
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import multiprocessing
+from http import HTTPStatus
+from itertools import count
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from main import get_stacked_tables
+from scoring import get_french_scorer
+from pipeline import fingerprint, classify, score_result, CRACKERS, DECRYPTERS
+
+ACTIONS = ('decrypt', 'crack', 'solve')
+FINAL_STATES = ('done', 'failed', 'cancelled')
+MAX_BODY = 64 << 20
+MAX_QUEUED = 64
+MAX_FINISHED = 1024
+PROGRESS_INTERVAL = 0.5
+
+"""
+Workers
+"""
+
+
+def warm_worker():
+    """
+    Build the rotor tables and load the french scorer, in the service so that every job process forked
+    from it starts with them
+    """
+    get_stacked_tables()
+    get_french_scorer()
+
+
+class Reporter:
+
+    def __init__(self, connection, interval: float = PROGRESS_INTERVAL):
+        """
+        Init
+        :param connection: sending end of the pipe to the service
+        :param interval: minimal number of seconds between two progress events of a stage
+        """
+        self.connection = connection
+        self.interval = interval
+        self.last = {}
+
+    def send(self, event: str, **fields):
+        """
+        Send an event to the service
+        :param event:
+        :param fields: JSON serializable fields of the event
+        """
+        self.connection.send((event, fields))
+
+    def progress(self, stage: str, done: int, total: int):
+        """
+        Send the progress of a stage of a cracker, at most once per interval but always for its last step
+        :param stage:
+        :param done:
+        :param total:
+        """
+        now = time.perf_counter()
+        if done < total and now - self.last.get(stage, -self.interval) < self.interval:
+            return
+        self.last[stage] = now
+        self.send('progress', stage=stage, done=done, total=total)
+
+
+def run_job(connection, action: str, cipher: str, message: str, key=None, crib: str = None):
+    """
+    Run a job in its own process, its events going to the service through a pipe
+    :param connection: sending end of the pipe
+    :param action: 'decrypt', 'crack' or 'solve'
+    :param cipher: cipher of the message, guessed by 'solve'
+    :param message:
+    :param key: key of the message, for 'decrypt'
+    :param crib: end of the clear message, for 'crack' on enigma
+    """
+    # the service stops its jobs itself, and its event loop is not running here
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.set_wakeup_fd(-1)
+    reporter = Reporter(connection)
+    try:
+        if action == 'solve':
+            stats = fingerprint(message)
+            result = {'cipher': classify(stats), 'fingerprint': stats}
+            reporter.send('fingerprint', **result)
+            if result['cipher'] in CRACKERS:
+                result.update(CRACKERS[result['cipher']](message, reporter.progress))
+        elif action == 'crack':
+            result = CRACKERS[cipher](message, reporter.progress, **({} if crib is None else {'crib': crib}))
+        else:
+            result = {'key': key, 'clear': DECRYPTERS[cipher](message, key)}
+        if 'clear' in result:
+            score_result(result)
+        reporter.send('done', result=result)
+    except Exception as error:
+        reporter.send('failed', error=f'{type(error).__name__}: {error}')
+    finally:
+        connection.close()
+
+
+async def wait_readable(fd: int):
+    """
+    Wait until a file descriptor can be read without blocking the event loop
+    :param fd:
+    """
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_reader(fd)
+
+
+"""
+Jobs
+"""
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status: int, message: str):
+        """
+        Init
+        :param status: HTTP status code
+        :param message:
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+
+    def __init__(self, job_id: str, action: str, cipher: str, message: str, key=None, crib: str = None):
+        """
+        Init
+        :param job_id:
+        :param action: 'decrypt', 'crack' or 'solve'
+        :param cipher: cipher of the message, guessed by 'solve'
+        :param message:
+        :param key: key of the message, for 'decrypt'
+        :param crib: end of the clear message, for 'crack' on enigma
+        """
+        self.id = job_id
+        self.action = action
+        self.cipher = cipher
+        self.message = message
+        self.key = key
+        self.crib = crib
+        self.state = 'queued'
+        self.result = None
+        self.error = None
+        self.task = None
+        self.events = []
+        self.changed = asyncio.Condition()
+        self.created = time.time()
+
+    async def emit(self, event: str, **fields):
+        """
+        Record an event and wake up the clients following the job
+        :param event:
+        :param fields: JSON serializable fields of the event
+        """
+        self.events.append(dict(event=event, job=self.id, time=time.time(), **fields))
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def finish(self, state: str, **fields):
+        """
+        End the job, its message being dropped
+        :param state: 'done', 'failed' or 'cancelled'
+        :param fields: result or error
+        """
+        self.state, self.message = state, None
+        self.result, self.error = fields.get('result'), fields.get('error')
+        await self.emit(state, **fields)
+
+    async def follow(self):
+        """
+        Yield the events of the job, past ones first, until it is over
+        :return asynchronous generator of events:
+        """
+        index = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.events) > index)
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.state in FINAL_STATES:
+                return
+
+    def summary(self) -> dict:
+        """
+        Get the state of the job
+        :return dictionary with the result or the error once the job is over:
+        """
+        summary = {'id': self.id, 'action': self.action, 'cipher': self.cipher, 'state': self.state,
+                   'created': self.created}
+        if self.state == 'done':
+            summary['result'] = self.result
+        elif self.state == 'failed':
+            summary['error'] = self.error
+        return summary
+
+
+class JobService:
+
+    def __init__(self, max_jobs: int = None, max_queued: int = MAX_QUEUED, max_finished: int = MAX_FINISHED):
+        """
+        Init
+        :param max_jobs: number of jobs run at the same time, each in its own process, one per core by default
+        :param max_queued: number of jobs waiting, a job posted when the queue is full being refused
+        :param max_finished: number of finished jobs kept, the oldest one being dropped first
+        """
+        self.max_jobs = max_jobs or os.cpu_count()
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.jobs = {}
+        self.finished = deque()
+        self.ids = count(1)
+        self.context = None
+        self.queue = None
+        self.runners = []
+
+    async def start(self):
+        """
+        Warm up the service and start the job runners
+        Job processes are forked where possible, so that they share the tables and the models
+        """
+        warm_worker()
+        fork = 'fork' in multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context('fork' if fork else None)
+        self.queue = asyncio.Queue(self.max_queued)
+        self.runners = [asyncio.create_task(self.run()) for runner in range(self.max_jobs)]
+
+    async def close(self):
+        """
+        Cancel the jobs, terminating their processes, and stop the runners
+        """
+        for job in list(self.jobs.values()):
+            await self.cancel(job)
+        for runner in self.runners:
+            runner.cancel()
+        await asyncio.gather(*self.runners, return_exceptions=True)
+
+    def submit(self, request: dict) -> Job:
+        """
+        Queue a job
+        :param request: dictionary of action, cipher, key and message
+        :return job:
+        """
+        if not isinstance(request, dict):
+            raise HTTPError(400, 'The body must be a JSON object')
+        action, cipher, message = request.get('action', 'solve'), request.get('cipher'), request.get('message')
+        if action not in ACTIONS:
+            raise HTTPError(400, f'Unknown action {action!r}, expected one of {", ".join(ACTIONS)}')
+        if not isinstance(message, str):
+            raise HTTPError(400, 'The message must be a string')
+        if action == 'decrypt' and (cipher not in DECRYPTERS or request.get('key') is None):
+            raise HTTPError(400, f'decrypt needs a key and a cipher among {", ".join(DECRYPTERS)}')
+        if action == 'crack' and cipher not in CRACKERS:
+            raise HTTPError(400, f'crack needs a cipher among {", ".join(CRACKERS)}')
+        if request.get('crib') is not None and (action != 'crack' or cipher != 'enigma'
+                                                or not isinstance(request['crib'], str)):
+            raise HTTPError(400, 'A crib is only taken by crack on enigma, as a string')
+        if self.queue.full():
+            raise HTTPError(503, f'{self.max_queued} jobs are already waiting')
+        job = Job(str(next(self.ids)), action, cipher if action != 'solve' else None, message, request.get('key'),
+                  request.get('crib'))
+        self.jobs[job.id] = job
+        self.queue.put_nowait(job)
+        job.events.append({'event': 'queued', 'job': job.id, 'time': job.created, 'position': self.queue.qsize()})
+        return job
+
+    async def cancel(self, job: Job):
+        """
+        Cancel a job, terminating its process if it is running
+        :param job:
+        """
+        if job.state == 'queued':
+            await job.finish('cancelled')
+            self.retire(job)
+        elif job.state == 'running':
+            job.task.cancel()
+            await asyncio.wait([job.task])
+
+    def retire(self, job: Job):
+        """
+        Keep a finished job, dropping the oldest ones over max_finished
+        :param job:
+        """
+        self.finished.append(job.id)
+        while len(self.finished) > self.max_finished:
+            self.jobs.pop(self.finished.popleft(), None)
+
+    async def run(self):
+        """
+        Run the queued jobs one at a time
+        """
+        while True:
+            job = await self.queue.get()
+            if job.state == 'queued':
+                job.state, job.task = 'running', asyncio.create_task(self.execute(job))
+                await asyncio.wait([job.task])
+                self.retire(job)
+
+    async def execute(self, job: Job):
+        """
+        Run a job in its own process, emitting the events it sends until it is over
+        :param job:
+        """
+        receiver, sender = self.context.Pipe(duplex=False)
+        process = self.context.Process(target=run_job, daemon=True,
+                                       args=(sender, job.action, job.cipher, job.message, job.key, job.crib))
+        try:
+            await job.emit('started')
+            process.start()
+            sender.close()
+            while True:
+                try:
+                    await wait_readable(receiver.fileno())
+                    event, fields = receiver.recv()
+                except EOFError:
+                    await wait_readable(process.sentinel)
+                    process.join()
+                    await job.finish('failed', error=f'The job process exited with code {process.exitcode}')
+                    return
+                if event in ('done', 'failed'):
+                    await job.finish(event, **fields)
+                    return
+                if event == 'fingerprint':
+                    job.cipher = fields['cipher']
+                await job.emit(event, **fields)
+        except asyncio.CancelledError:
+            await job.finish('cancelled')
+        finally:
+            sender.close()
+            receiver.close()
+            if process.pid is not None:
+                if job.state == 'cancelled' and process.exitcode is None:
+                    process.terminate()
+                await wait_readable(process.sentinel)
+                process.join()
+
+    """
+    HTTP
+    """
+
+    def get_job(self, job_id: str) -> Job:
+        """
+        Get a job from its id
+        :param job_id:
+        :return job:
+        """
+        if job_id not in self.jobs:
+            raise HTTPError(404, f'No job {job_id}')
+        return self.jobs[job_id]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answer a HTTP request, the connection being closed after the response
+        :param reader:
+        :param writer:
+        """
+        try:
+            try:
+                method, target, version = (await reader.readline()).decode('latin-1').split()
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, separator, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    raise HTTPError(413, f'The body is over {MAX_BODY} bytes')
+                body = await reader.readexactly(length) if length else b''
+                await self.route(method, urlsplit(target), body, writer)
+            except HTTPError as error:
+                await self.respond(writer, error.status, {'error': str(error)})
+            except (ValueError, asyncio.IncompleteReadError) as error:
+                await self.respond(writer, 400, {'error': f'{type(error).__name__}: {error}'})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, target, body: bytes, writer: asyncio.StreamWriter):
+        """
+        Dispatch a request
+        :param method:
+        :param target: split request target
+        :param body:
+        :param writer:
+        """
+        parts = target.path.strip('/').split('/')
+        if parts[0] != 'jobs' or len(parts) > 3 or (len(parts) == 3 and parts[2] != 'events'):
+            raise HTTPError(404, f'No route {target.path}')
+        if len(parts) == 1 and method == 'GET':
+            await self.respond(writer, 200, [job.summary() for job in self.jobs.values()])
+        elif len(parts) == 1 and method == 'POST':
+            job = self.submit(json.loads(body or b'{}'))
+            if parse_qs(target.query).get('stream', ['0'])[0] not in ('0', 'false'):
+                await self.stream(writer, job)
+            else:
+                await self.respond(writer, 202, job.summary())
+        elif len(parts) == 2 and method == 'GET':
+            await self.respond(writer, 200, self.get_job(parts[1]).summary())
+        elif len(parts) == 2 and method == 'DELETE':
+            job = self.get_job(parts[1])
+            await self.cancel(job)
+            await self.respond(writer, 200, job.summary())
+        elif len(parts) == 3 and method == 'GET':
+            await self.stream(writer, self.get_job(parts[1]))
+        else:
+            raise HTTPError(405, f'No {method} on {target.path}')
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: int, payload):
+        """
+        Send a JSON response
+        :param writer:
+        :param status:
+        :param payload: JSON serializable body
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode('utf8')
+        writer.write(f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+    @staticmethod
+    async def stream(writer: asyncio.StreamWriter, job: Job):
+        """
+        Send the events of a job as chunked JSON lines until it is over, a client going away leaving the
+        job running
+        :param writer:
+        :param job:
+        """
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n'
+                     b'Connection: close\r\n\r\n')
+        async for event in job.follow():
+            line = json.dumps(event, ensure_ascii=False).encode('utf8') + b'\n'
+            writer.write(f'{len(line):x}\r\n'.encode('latin-1') + line + b'\r\n')
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+
+"""
+Main
+"""
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8633, socket: str = None, max_jobs: int = None,
+                max_queued: int = MAX_QUEUED):
+    """
+    Run the service until interrupted
+    :param host:
+    :param port:
+    :param socket: unix socket path, listening on it rather than on host and port
+    :param max_jobs: number of jobs run at the same time
+    :param max_queued: number of jobs waiting
+    """
+    service = JobService(max_jobs, max_queued)
+    await service.start()
+    if socket is not None:
+        server = await asyncio.start_unix_server(service.handle, socket)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+    print(f'Listening on {socket or f"http://{host}:{port}"}, running {service.max_jobs} jobs at a time',
+          file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+        if socket is not None and os.path.exists(socket):
+            os.remove(socket)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8633)
+    parser.add_argument('--socket', default=None, help='unix socket to listen on instead of host and port')
+    parser.add_argument('--max-jobs', type=int, default=None,
+                        help='number of jobs run at the same time, each in its own process, one per core by default')
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED, help='number of jobs waiting')
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.socket, arguments.max_jobs, arguments.max_queued))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,197 @@
+"""
+Give the message store: a directory of messages indexed on first use, each file being memory-mapped
+and decoded only when it is accessed, only the last used maps and texts being kept
+The codes of a message are backed by a map so that processes share their pages: the map of the file
+itself when its bytes are its code points, otherwise the map of its codes decoded once into the codes
+directory, next to the result cache
+"""
+
+import os
+import mmap
+import codecs
+import hashlib
+import numpy as np
+from collections.abc import Mapping
+from cache import get_cache_directory
+from text import CodeText
+
+
+class MessageStore(Mapping):
+
+    def __init__(self, directory: str, suffix: str = '.txt', encoding: str = 'utf8', newline: str = None,
+                 cache_size: int = 16, codes_directory: str = None):
+        """
+        Init
+        :param directory: messages directory, a relative one being taken from the current directory
+        :param suffix: suffix of the message files, removed from their names
+        :param encoding:
+        :param newline: as in open, None turns every \\r\\n and \\r into \\n and '' keeps the text untouched
+        :param cache_size: number of maps and of decoded texts kept, the least recently used one being dropped
+        first
+        :param codes_directory: directory of the decoded codes, 'codes' next to the result cache by default,
+        none being written when the cache is off
+        """
+        self.directory = os.path.abspath(directory)
+        self.suffix = suffix
+        self.encoding = encoding
+        self.newline = newline
+        self.cache_size = cache_size
+        self.codes_directory = codes_directory
+        self.index = None
+        self.buffers = {}
+        self.texts = {}
+
+    @property
+    def paths(self) -> dict:
+        """
+        Paths of the messages by name, listed on first access
+        :return dictionary of paths:
+        """
+        if self.index is None:
+            with os.scandir(self.directory) as entries:
+                self.index = {entry.name[:len(entry.name) - len(self.suffix)]: entry.path
+                              for entry in sorted(entries, key=lambda entry: entry.name)
+                              if entry.is_file() and entry.name.endswith(self.suffix)}
+        return self.index
+
+    def refresh(self):
+        """
+        Forget the index and the loaded messages, to see the files changed since
+        """
+        self.index = None
+        while self.buffers:
+            self.release(next(iter(self.buffers)))
+        self.texts.clear()
+
+    def __getitem__(self, name: str) -> str:
+        return self.text(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def map_file(self, path: str):
+        """
+        Get the raw bytes of a file, memory-mapped so that processes share its pages
+        :param path:
+        :return mmap or bytes for an empty file:
+        """
+        if path in self.buffers:
+            self.buffers[path] = self.buffers.pop(path)
+        else:
+            if not os.path.getsize(path):
+                self.buffers[path] = b''
+            else:
+                with open(path, 'rb') as file:
+                    self.buffers[path] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            while len(self.buffers) > max(1, self.cache_size):
+                self.release(next(iter(self.buffers)))
+        return self.buffers[path]
+
+    def buffer(self, name: str):
+        """
+        Get the raw bytes of a message, see map_file
+        :param name:
+        :return mmap or bytes for an empty file:
+        """
+        return self.map_file(self.paths[name])
+
+    def release(self, path: str):
+        """
+        Forget the map of a file, closing it and its file descriptor unless arrays from codes still use
+        it, in which case it is closed once they are gone
+        :param path:
+        """
+        buffer = self.buffers.pop(path)
+        if isinstance(buffer, mmap.mmap):
+            try:
+                buffer.close()
+            except BufferError:
+                pass
+
+    def text(self, name: str) -> str:
+        """
+        Get the text of a message, decoded on first access
+        :param name:
+        :return text:
+        """
+        if name in self.texts:
+            self.texts[name] = self.texts.pop(name)
+        else:
+            with memoryview(self.buffer(name)) as view:
+                text = str(view, self.encoding)
+            if self.newline is None:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+            self.texts[name] = text
+            while len(self.texts) > max(1, self.cache_size):
+                del self.texts[next(iter(self.texts))]
+        return self.texts[name]
+
+    def is_raw(self, buffer) -> bool:
+        """
+        Check if the bytes of a message are its code points: latin-1, or plain ascii in an ascii
+        compatible encoding, without new lines to translate
+        :param buffer:
+        :return bool:
+        """
+        if self.newline is None and buffer.find(b'\r') >= 0:
+            return False
+        encoding = codecs.lookup(self.encoding).name
+        if encoding == 'iso8859-1':
+            return True
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        return encoding in ('utf-8', 'ascii') and (not len(raw) or raw.max() < 128)
+
+    def decoded_path(self, name: str, directory: str) -> str:
+        """
+        Get the file of the decoded codes of a message, writing it when it is missing or older than the
+        message, one byte per code when they are all below 256 and four otherwise
+        :param name:
+        :param directory: codes directory
+        :return path:
+        """
+        source = self.paths[name]
+        key = hashlib.sha256(f'{source}\0{self.encoding}\0{self.newline}'.encode('utf8', 'surrogatepass'))
+        base = os.path.join(directory, key.hexdigest())
+        for suffix in ('.u8', '.u32'):
+            if os.path.exists(base + suffix) and os.stat(base + suffix).st_mtime_ns >= os.stat(source).st_mtime_ns:
+                return base + suffix
+        codes = CodeText.from_text(self.text(name))
+        suffix = '.u32' if codes.wide else '.u8'
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{base}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(codes.codes.tobytes())
+        os.replace(temporary, base + suffix)
+        stale = base + ('.u8' if codes.wide else '.u32')
+        if os.path.exists(stale):
+            os.remove(stale)
+        return base + suffix
+
+    def codes(self, name: str) -> CodeText:
+        """
+        Get the codes of a message, backed by a read only map: the file itself when its bytes are its code
+        points, see is_raw, its decoded codes otherwise, see decoded_path
+        Without a codes directory, or when it cannot be written, the codes are decoded from the text
+        :param name:
+        :return code text:
+        """
+        buffer = self.buffer(name)
+        if self.is_raw(buffer):
+            return CodeText(np.frombuffer(buffer, dtype=np.uint8))
+        directory = self.codes_directory
+        if directory is None:
+            directory = get_cache_directory()
+            directory = None if directory is None else os.path.join(directory, 'codes')
+        if directory is None:
+            return CodeText.from_text(self.text(name))
+        try:
+            path = self.decoded_path(name, directory)
+        except OSError:
+            return CodeText.from_text(self.text(name))
+        return CodeText(np.frombuffer(self.map_file(path), dtype=np.uint32 if path.endswith('.u32') else np.uint8))
@@ -0,0 +1,9 @@
+"""
+Make the modules of the project importable from the tests and keep the tests away from the results cache
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['CRYPTO_CACHE'] = 'off'
@@ -0,0 +1,79 @@
+"""
+Check the result cache: least recently used eviction, disabling on errors and keys following the code and data
+"""
+
+import pytest
+import rotors as rt
+import scoring
+from cache import ResultCache, make_key
+from text import CodeText
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'results.sqlite'), max_size=100)
+
+
+def test_cached_computes_once(cache):
+    calls = []
+    compute = lambda: calls.append(1) or {'key': (3, 4)}
+    assert cache.cached('test', 'text', {'n': 1}, compute) == {'key': [3, 4]}
+    assert cache.cached('test', 'text', {'n': 1}, compute) == {'key': [3, 4]}
+    assert len(calls) == 1
+
+
+def test_eviction_drops_least_recently_used(cache):
+    cache.set('old', 'a' * 30)
+    cache.set('used', 'b' * 30)
+    cache.set('recent', 'c' * 30)
+    cache.get('old')
+    cache.set('new', 'd' * 30)
+    assert 'used' not in cache and 'recent' not in cache
+    assert 'old' in cache and 'new' in cache
+    assert cache.size <= 0.9 * cache.max_size
+
+
+def test_clear(cache):
+    cache.set('key', 1)
+    cache.clear()
+    assert 'key' not in cache and cache.size == 0
+
+
+def test_unwritable_cache_is_disabled(tmp_path):
+    (tmp_path / 'file').write_text('not a directory')
+    cache = ResultCache(str(tmp_path / 'file' / 'results.sqlite'))
+    with pytest.warns(RuntimeWarning, match='disabled'):
+        cache.set('key', 1)
+    assert cache.path is None
+    assert cache.get('key', 'missing') == 'missing'
+    assert cache.cached('test', 'text', None, lambda: 2) == 2
+
+
+def test_off_cache_keeps_nothing():
+    cache = ResultCache(None)
+    cache.set('key', 1)
+    assert 'key' not in cache and cache.get('key') is None
+
+
+def test_key_follows_inputs():
+    key = make_key('vigenere.key', 'text', {'share': 0.9})
+    assert key == make_key('vigenere.key', CodeText.from_text('text'), {'share': 0.9})
+    assert key != make_key('vigenere.key', 'text', {'share': 0.8})
+    assert key != make_key('vigenere.key', 'texts', {'share': 0.9})
+    assert key != make_key('shift.shift', 'text', {'share': 0.9})
+    assert key != make_key('vigenere.key', 'text', {'share': 0.9}, version='old')
+
+
+def test_key_follows_corpus(monkeypatch):
+    key = make_key('shift.shift', 'text')
+    monkeypatch.setattr(scoring, 'reference_digest', lambda: 'another corpus')
+    assert make_key('shift.shift', 'text') != key
+
+
+def test_key_follows_rotors(monkeypatch):
+    key = make_key('enigma.statistical', 'text')
+    registry = rt.RotorRegistry(rt.ROTORS_DATA)
+    monkeypatch.setattr(rt, 'registry', registry)
+    assert make_key('enigma.statistical', 'text') == key
+    registry.extend([range(255, -1, -1)])
+    assert make_key('enigma.statistical', 'text') != key
@@ -0,0 +1,68 @@
+"""
+Check that the enigma attacks recover the key a synthetic message was encrypted with
+"""
+
+import pytest
+from scoring import synthetic_text
+from keyspace import Keyspace
+from main import RotorEngine, enigma_crib_attack, enigma_force
+
+ORDER, OFFSETS = (5, 2, 7), (100, 37, 200)
+
+
+@pytest.fixture(scope='module')
+def clear():
+    return synthetic_text(3000) + 'Joel'
+
+
+@pytest.fixture(scope='module')
+def message(clear):
+    return RotorEngine(ORDER, index_offsets=OFFSETS).crypt(clear)
+
+
+def test_crypt_round_trip(clear, message):
+    assert message != clear
+    assert RotorEngine(ORDER, index_offsets=OFFSETS).decrypt(message) == clear
+
+
+def test_class_members_decrypt_alike(message):
+    start = len(message) - 4
+    for offsets in Keyspace().expand(OFFSETS, start, len(message))[:50].tolist():
+        assert RotorEngine(ORDER, index_offsets=offsets).decrypt(message[start:], start) == 'Joel'
+
+
+def test_crib_attack(clear, message):
+    crib = clear[-12:]
+    keys = enigma_crib_attack(message, crib)
+    assert (ORDER, OFFSETS) in keys
+    start = len(message) - len(crib)
+    for order, offsets in keys:
+        assert RotorEngine(order, index_offsets=offsets).decrypt(message[start:], start) == crib
+
+
+def test_crib_attack_position(clear, message):
+    keys = enigma_crib_attack(message, clear[1000:1012], position=1000)
+    assert (ORDER, OFFSETS) in keys
+
+
+def test_enigma_force(clear, message):
+    order, offsets = enigma_force(message, workers=1)
+    assert order == ORDER
+    assert offsets[:2] == OFFSETS[:2]
+    assert RotorEngine(order, index_offsets=offsets).decrypt(message) == clear
+
+
+def test_enigma_force_missing_crib(message):
+    assert enigma_force(message[:-1] + '#', workers=1, crib='Joel#') is None
+
+
+@pytest.mark.parametrize('crib, position', [('', None), ('Joel' * 1000, None), ('Joel', -1), ('Joel', 3001)])
+def test_crib_attack_rejects_bad_crib(message, crib, position):
+    with pytest.raises(ValueError):
+        enigma_crib_attack(message, crib, position)
+
+
+@pytest.mark.parametrize('crib', ['', 'Joel' * 1000])
+def test_enigma_force_rejects_bad_crib(message, crib):
+    with pytest.raises(ValueError):
+        enigma_force(message, workers=1, crib=crib)
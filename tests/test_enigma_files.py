@@ -0,0 +1,53 @@
+"""
+Check that byte ranges of an enigma encrypted file decrypt like the same slices of the clear text
+"""
+
+import pytest
+from main import Enigma
+
+ROTORS, CONFIG = [0, 1, 2], [3, 14, 15]
+CLEAR = 'Une phrase en français, chiffrée par enigma puis déchiffrée par morceaux.\n' * 20
+
+
+@pytest.fixture(params=['latin-1', 'utf-8'])
+def encrypted(request, tmp_path):
+    source, destination = tmp_path / 'clear.txt', tmp_path / 'encrypted.txt'
+    source.write_text(CLEAR, encoding=request.param, newline='')
+    Enigma.encrypt_file(str(source), str(destination), ROTORS, CONFIG, encoding=request.param)
+    return str(destination), request.param
+
+
+@pytest.mark.parametrize('start, stop', [(0, len(CLEAR)), (0, 10), (75, 300), (len(CLEAR) - 40, len(CLEAR))])
+def test_range_matches_clear(encrypted, start, stop):
+    path, encoding = encrypted
+    with open(path, 'r', encoding=encoding, newline='') as file:
+        message = file.read()
+    # the range is given in bytes of the encrypted file, on char boundaries
+    byte_start, byte_stop = (len(message[:index].encode(encoding)) for index in (start, stop))
+    assert Enigma.decrypt_range(path, byte_start, byte_stop, ROTORS, CONFIG, encoding) == CLEAR[start:stop]
+
+
+def test_negative_range(encrypted):
+    path, encoding = encrypted
+    with open(path, 'r', encoding=encoding, newline='') as file:
+        last = file.read()[-1]
+    assert Enigma.decrypt_range(path, -len(last.encode(encoding)), None, ROTORS, CONFIG, encoding) == '\n'
+
+
+@pytest.mark.parametrize('start, stop', [(10, 10), (300, 75), (1 << 20, None)])
+def test_empty_range(encrypted, start, stop):
+    path, encoding = encrypted
+    assert Enigma.decrypt_range(path, start, stop, ROTORS, CONFIG, encoding) == ''
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_bytes(b'')
+    assert Enigma.decrypt_range(str(path), 0, None, ROTORS, CONFIG) == ''
+
+
+def test_other_encoding_rejected(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        Enigma.decrypt_range(str(path), 0, None, ROTORS, CONFIG, encoding='utf-16')
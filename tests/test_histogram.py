@@ -0,0 +1,47 @@
+"""
+Check the chars histogram against collections.Counter
+"""
+
+from collections import Counter
+from histogram import Histogram
+from text import CodeText
+
+TEXT = "L'été, à Noël ou en ħiver : les chars au-dessus de 255 comptent aussi ∑."
+
+
+def test_counts_like_counter():
+    histogram = Histogram.from_text(TEXT)
+    assert histogram.to_dict() == dict(Counter(TEXT))
+    assert histogram.total() == len(TEXT)
+    assert len(histogram) == len(set(TEXT))
+    assert histogram['é'] == 2 and histogram['z'] == 0 and histogram['￿'] == 0
+    assert histogram.most_common() == ' '
+
+
+def test_code_text_counts_like_str():
+    assert Histogram.from_text(CodeText.from_text(TEXT)).to_dict() == Histogram.from_text(TEXT).to_dict()
+
+
+def test_merge_of_chunks_is_whole():
+    chunks = [TEXT[i:i + 7] for i in range(0, len(TEXT), 7)]
+    merged = Histogram.merge(Histogram.from_text(chunk) for chunk in chunks)
+    assert merged.to_dict() == dict(Counter(TEXT))
+    assert (Histogram.from_text('abc') + Histogram.from_text('∑a')).to_dict() == {'a': 2, 'b': 1, 'c': 1, '∑': 1}
+
+
+def test_empty():
+    for histogram in (Histogram(), Histogram.from_text(''), Histogram.merge([])):
+        assert histogram.total() == 0 and len(histogram) == 0 and histogram.to_dict() == {}
+
+
+def test_strided_columns():
+    for period in (1, 3, 8, len(TEXT) + 5):
+        columns = Histogram.strided(TEXT, period)
+        assert len(columns) == period
+        for i, column in enumerate(columns):
+            assert column.to_dict() == dict(Counter(TEXT[i::period]))
+        assert Histogram.merge(columns).to_dict() == dict(Counter(TEXT))
+
+
+def test_strided_empty():
+    assert [column.total() for column in Histogram.strided('', 4)] == [0, 0, 0, 0]
@@ -0,0 +1,71 @@
+"""
+Check the keyspace of the enigma brute force against brute force enumerations
+"""
+
+import numpy as np
+import pytest
+from itertools import permutations, product
+from keyspace import rank_permutation, unrank_permutation, offset_classes, count_distinct, Keyspace
+
+
+@pytest.mark.parametrize('n', [3, 4, 5, 8])
+def test_rank_follows_permutations_order(n):
+    for rank, perm in enumerate(permutations(range(n), 3)):
+        assert rank_permutation(perm, n) == rank
+        assert unrank_permutation(rank, n) == perm
+
+
+@pytest.mark.parametrize('n', [3, 4, 5, 8])
+def test_unrank_array(n):
+    expected = np.array(list(permutations(range(n), 3)))
+    a, b, c = unrank_permutation(np.arange(len(expected)), n)
+    assert (np.stack([a, b, c], axis=1) == expected).all()
+
+
+def test_rank_large():
+    for perm in [(0, 1, 2), (255, 254, 253), (7, 200, 3), (128, 0, 255)]:
+        assert unrank_permutation(rank_permutation(perm, 256), 256) == perm
+
+
+def test_count_distinct():
+    ranges = [range(start, stop) for start in range(6) for stop in range(start, 7)]
+    for c0, c1, c2 in product(ranges, repeat=3):
+        expected = sum(len({a, b, c}) == 3 for a, b, c in product(c0, c1, c2))
+        assert count_distinct(c0, c1, c2) == expected
+
+
+@pytest.mark.parametrize('start, stop', [(0, 4), (250, 262), (1000, 1300), (65530, 65540), (99111, 99115)])
+@pytest.mark.parametrize('level', [0, 1, 2])
+def test_offset_classes(start, stop, level):
+    step = 256 ** level
+    signatures = [tuple((index + offset) // step % 256 for index in range(start, stop)) for offset in range(256)]
+    classes = offset_classes(start, stop, level)
+    assert [offset for c in classes for offset in c] == list(range(256))
+    for c in classes:
+        assert len({signatures[offset] for offset in c}) == 1
+    assert len({signatures[c.start] for c in classes}) == len(classes)
+
+
+def test_key_index():
+    keyspace = Keyspace(shard_size=1000)
+    for index in [0, 1, 335, 336, 123456789, len(keyspace) - 1]:
+        assert keyspace.index(keyspace.key(index)) == index
+    shard = keyspace.shard(3)
+    block = keyspace.shard_block(3)
+    assert len(block) == len(shard)
+    for row, index in zip(block[::997], shard[::997]):
+        order, offsets = keyspace.key(index)
+        assert tuple(row.tolist()) == order + offsets
+
+
+@pytest.mark.parametrize('start, stop', [(5000, 5004), (65530, 65540)])
+def test_collapse_expand(start, stop):
+    full = Keyspace()
+    collapsed, weights = full.collapse(start, stop)
+    assert sum(weights) == full.nb_offsets
+    for rank in [0, len(weights) // 2, len(weights) - 1]:
+        offsets = tuple(collapsed.offsets[rank].tolist())
+        members = full.expand(offsets, start, stop)
+        assert len(members) == weights[rank]
+        assert tuple(members[0].tolist()) == offsets
+        assert len({tuple(row) for row in members.tolist()}) == weights[rank]
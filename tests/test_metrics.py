@@ -0,0 +1,96 @@
+"""
+Check the counters of the workers, their merge in the collector and the JSON and Prometheus exports
+"""
+
+import json
+import pstats
+import pytest
+from metrics import Counters, Collector, profile_call
+from main import RotorEngine, enigma_force
+
+
+def test_counters_flush_after_interval():
+    counters = Counters(interval=3600)
+    counters.add('keys', 10)
+    counters.add('keys', 5)
+    assert counters.flush() is None
+    assert counters.flush(force=True) == {'keys': 15}
+    assert counters.flush(force=True) == {}
+    counters = Counters(interval=0)
+    counters.add('shards')
+    assert counters.flush() == {'shards': 1}
+
+
+def test_timer_adds_seconds():
+    counters = Counters()
+    with pytest.raises(KeyError):
+        with counters.timer('decrypt_seconds'):
+            raise KeyError
+    with counters.timer('decrypt_seconds'):
+        pass
+    assert 0 <= counters.values['decrypt_seconds'] < 1
+
+
+def filled_collector(path=None) -> Collector:
+    collector = Collector(path, total=10, done=2, interval=3600)
+    collector.merge(0, {'keys': 1000, 'survivors_1': 100, 'decrypt_seconds': 2.0})
+    collector.merge(0, {'keys': 1000, 'survivors_1': 60, 'decrypt_seconds': 2.0})
+    collector.merge(1, {'keys': 2000, 'survivors_1': 40, 'survivors_2': 4, 'keyspace_seconds': 1.0})
+    collector.update(3)
+    return collector
+
+
+def test_summary_merges_workers():
+    summary = filled_collector().summary()
+    assert summary['totals'] == {'keys': 4000, 'survivors_1': 200, 'survivors_2': 4, 'decrypt_seconds': 4.0,
+                                 'keyspace_seconds': 1.0}
+    assert summary['shards_done'] == 5 and summary['shards_total'] == 10
+    assert summary['pruned_after'] == {'survivors_1': pytest.approx(0.95), 'survivors_2': pytest.approx(0.999)}
+    assert summary['workers']['0']['keys_per_second'] == 500
+    assert summary['workers']['1']['keys_per_second'] == 2000
+    assert summary['eta_seconds'] == pytest.approx(5 / summary['shards_per_second'])
+
+
+def test_json_export(tmp_path):
+    path = tmp_path / 'metrics.json'
+    filled_collector(str(path)).export()
+    exported = json.loads(path.read_text(encoding='utf8'))
+    assert exported['totals']['keys'] == 4000
+    assert not (tmp_path / 'metrics.json.tmp').exists()
+
+
+def test_prometheus_export(tmp_path):
+    path = tmp_path / 'metrics.prom'
+    filled_collector(str(path)).export()
+    samples = {}
+    for line in path.read_text(encoding='utf8').splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    assert samples['enigma_force_shards_done'] == 5
+    assert samples['enigma_force_pruned_ratio{after="1"}'] == pytest.approx(0.95)
+    assert samples['enigma_force_worker_keys{worker="1"}'] == 2000
+    assert 'enigma_force_worker_survivors_2{worker="0"}' not in samples
+
+
+def test_update_exports_after_interval(tmp_path):
+    path = tmp_path / 'metrics.json'
+    collector = Collector(str(path), total=4, interval=0)
+    collector.update()
+    assert json.loads(path.read_text(encoding='utf8'))['shards_done'] == 1
+
+
+def test_profile_call(tmp_path):
+    path = tmp_path / 'call.prof'
+    assert profile_call(str(path), sorted, [3, 1, 2]) == [1, 2, 3]
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_enigma_force_exports_run(tmp_path):
+    path = tmp_path / 'force.json'
+    message = RotorEngine((1, 0, 2), index_offsets=(3, 4, 5)).crypt('Salut Joel')
+    assert enigma_force(message, workers=1, metrics=str(path)) is not None
+    exported = json.loads(path.read_text(encoding='utf8'))
+    # the search stops at the shard holding the key
+    assert 0 < exported['shards_done'] <= exported['shards_total']
+    assert exported['totals']['keys'] > 0
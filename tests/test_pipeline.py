@@ -0,0 +1,51 @@
+"""
+Check that the pipeline only counts as solved the messages whose clear text reads as french
+"""
+
+import json
+import numpy as np
+import pipeline
+from scoring import synthetic_text
+from text import CodeText
+
+
+def shifted(text: str, shift: int) -> str:
+    return str(CodeText(CodeText.from_text(text).widen() + shift))
+
+
+def test_french_result_is_solved():
+    result = pipeline.score_result({'clear': synthetic_text(5000)})
+    assert result['solved'] and result['score'] > pipeline.CLEAR_SCORE
+
+
+def test_garbage_result_is_not_solved():
+    noise = np.random.default_rng(0).integers(0, 256, 5000).astype(np.uint8)
+    result = pipeline.score_result({'clear': str(CodeText(noise))})
+    assert not result['solved'] and result['score'] < pipeline.SOLVED_SCORE
+
+
+def test_solve_shift():
+    clear = synthetic_text(5000)
+    result = pipeline.solve(shifted(clear, -7))
+    assert result['cipher'] == 'shift'
+    assert result['clear'] == clear and result['solved'] is True
+
+
+def test_solve_directory_counts_unsolved(tmp_path, monkeypatch):
+    messages, output = tmp_path / 'messages', tmp_path / 'results'
+    messages.mkdir()
+    clear = synthetic_text(5000)
+    (messages / 'good.txt').write_text(shifted(clear, -3), encoding='utf8')
+    (messages / 'bad.txt').write_text(shifted(clear, -5), encoding='utf8')
+    crack_shift = pipeline.crack_shift
+
+    def crack_badly(message, progress=None):
+        result = crack_shift(message, progress)
+        if result['key'] != 3:
+            result['clear'] = shifted(result['clear'], -1)
+        return result
+
+    monkeypatch.setitem(pipeline.CRACKERS, 'shift', crack_badly)
+    assert pipeline.solve_directory(str(messages), str(output), workers=1) == {'shift': 1, 'unsolved': 1}
+    bad = json.loads((output / 'bad.json').read_text(encoding='utf8'))
+    assert bad['solved'] is False and bad['cipher'] == 'shift'
@@ -0,0 +1,95 @@
+"""
+Check that the vectorized predicates agree with their char by char version, and the early abort of
+decrypt_checked
+"""
+
+import numpy as np
+import pytest
+from predicates import Predicate, Crib, Charset, Printable, Latin1Text, Frequency
+from main import RotorEngine
+from scoring import synthetic_text
+
+PREDICATES = [Predicate, lambda: Crib('Joël', 4), lambda: Charset('abc '), Printable, Latin1Text,
+              lambda: Frequency(warmup=4)]
+
+
+def one_by_one(make, rows: np.ndarray, start: int) -> np.ndarray:
+    """
+    Run accepts on every candidate alone, each candidate having its own predicate
+    """
+    alive = []
+    for row in rows:
+        predicate = make()
+        predicate.reset()
+        alive.append(all(predicate.accepts(start + index, int(code)) for index, code in enumerate(row)))
+    return np.array(alive)
+
+
+def at_once(make, rows: np.ndarray, start: int) -> np.ndarray:
+    """
+    Run check on every candidate at once, dropping the rejected ones as decrypt_batch does
+    """
+    predicate = make()
+    predicate.reset(len(rows))
+    candidates = np.arange(len(rows))
+    for index in range(rows.shape[1]):
+        mask = predicate.check(start + index, rows[candidates, index])
+        candidates = candidates[mask]
+        predicate.keep(mask)
+    alive = np.zeros(len(rows), dtype=bool)
+    alive[candidates] = True
+    return alive
+
+
+@pytest.mark.parametrize('make', PREDICATES)
+def test_check_agrees_with_accepts(make):
+    generator = np.random.default_rng(0)
+    french = np.frombuffer(synthetic_text(400).encode('latin-1'), dtype=np.uint8)
+    rows = [french[i:i + 12] for i in range(0, 240, 12)]
+    rows += [np.frombuffer(text.encode('latin-1'), dtype=np.uint8) for text in ('abc Joël ab ', 'abcab cab ba')]
+    rows += list(generator.integers(0, 256, (40, 12)))
+    rows = np.array(rows)
+    for start in (3, 0):
+        expected = one_by_one(make, rows, start)
+        assert np.array_equal(at_once(make, rows, start), expected)
+    assert expected.any() and not expected.all() or make is Predicate
+
+
+def test_crib_only_checks_its_chars():
+    crib = Crib('Joël', 5)
+    assert crib.accepts(4, 0) and crib.accepts(9, 0)
+    assert crib.accepts(7, ord('ë')) and not crib.accepts(7, ord('e'))
+    assert crib.check(3, np.array([1, 2])).all()
+
+
+def test_frequency_waits_for_warmup():
+    frequency = Frequency(threshold=0.5, warmup=4)
+    assert all(frequency.accepts(index, ord('#')) for index in range(3))
+    assert not frequency.accepts(3, ord('#'))
+    frequency.reset()
+    assert all(frequency.accepts(index, ord(char)) for index, char in enumerate('e#e#e#'))
+
+
+def test_charsets():
+    assert Printable().accepts(0, ord('\n')) and not Printable().accepts(0, 0x07)
+    assert Latin1Text().accepts(0, ord('é')) and not Latin1Text().accepts(0, ord('#'))
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return RotorEngine((3, 0, 7), index_offsets=(1, 2, 3))
+
+
+def test_decrypt_checked_keeps_good_key(engine):
+    clear = synthetic_text(500) + 'Joel'
+    message = engine.crypt(clear)
+    predicates = [Crib('Joel', 500), Printable()]
+    assert engine.decrypt_checked(message, predicates) == clear == engine.decrypt(message)
+    assert engine.decrypt_checked(message[100:], [], start=100) == clear[100:]
+
+
+def test_decrypt_checked_aborts_wrong_key(engine):
+    message = engine.crypt(synthetic_text(500) + 'Joel')
+    wrong = RotorEngine((3, 0, 7), index_offsets=(2, 2, 3))
+    assert wrong.decrypt_checked(message, [Latin1Text()]) is None
+    assert engine.decrypt_checked(message, [Crib('Zoe!', 500)]) is None
@@ -0,0 +1,77 @@
+"""
+Check the rotor registry: validation, inverse tables, stacked arrays and loading rotors from JSON
+"""
+
+import os
+import sys
+import json
+import random
+import subprocess
+import numpy as np
+import pytest
+import rotors as rt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def permutation(seed: int) -> list:
+    values = list(range(256))
+    random.Random(seed).shuffle(values)
+    return values
+
+
+@pytest.mark.parametrize('rotor', [list(range(255)), list(range(257)), [0] * 256, list(range(1, 257))])
+def test_invalid_rotor_rejected(rotor):
+    with pytest.raises(ValueError):
+        rt.validate_rotor(rotor)
+
+
+def test_inverse_undoes_rotor():
+    rotor = rt.validate_rotor(permutation(0))
+    inverse = rt.invert_rotor(rotor)
+    assert all(inverse[rotor[code]] == code for code in range(256))
+
+
+def test_shipped_rotors():
+    assert len(rt.registry) == len(rt.ROTORS_DATA)
+    for rotor_id, data in enumerate(rt.ROTORS_DATA):
+        forward, inverse = rt.registry.tables(rotor_id)
+        assert list(forward) == data
+        assert inverse == rt.invert_rotor(forward)
+    assert rt.get_rotors([2, 0]) == [rt.ROTORS_DATA[2], rt.ROTORS_DATA[0]]
+    assert rt.get_rotors(getsAll=True) == rt.ROTORS_DATA
+
+
+def test_extend_keeps_ids_and_stacks():
+    registry = rt.RotorRegistry([permutation(1)])
+    digest = registry.digest
+    assert registry.extend([permutation(2), permutation(3)]) == [1, 2]
+    assert registry.digest != digest
+    assert registry.forward_stack.shape == registry.inverse_stack.shape == (3, 256)
+    assert registry.forward_stack.dtype == np.uint8 and not registry.forward_stack.flags.writeable
+    assert registry.forward_stack[2].tolist() == permutation(3)
+    assert (registry.inverse_stack[1][registry.forward_stack[1]] == np.arange(256)).all()
+
+
+def test_bad_rotor_leaves_registry_unchanged():
+    registry = rt.RotorRegistry([permutation(1)])
+    with pytest.raises(ValueError):
+        registry.extend([permutation(2), [0] * 256])
+    assert len(registry) == 1 and registry.forward_stack.shape == (1, 256)
+
+
+def test_load(tmp_path):
+    path = tmp_path / 'rotors.json'
+    path.write_text(json.dumps([permutation(4), permutation(5)]), encoding='utf8')
+    registry = rt.RotorRegistry(rt.ROTORS_DATA)
+    assert registry.load(str(path)) == [len(rt.ROTORS_DATA), len(rt.ROTORS_DATA) + 1]
+    assert list(registry.tables(len(rt.ROTORS_DATA) + 1)[0]) == permutation(5)
+
+
+def test_environment_variable_loads_rotors(tmp_path):
+    path = tmp_path / 'rotors.json'
+    path.write_text(json.dumps([permutation(6)]), encoding='utf8')
+    environment = dict(os.environ, **{rt.ROTORS_VARIABLE: str(path)})
+    output = subprocess.run([sys.executable, '-c', 'import rotors; print(len(rotors.registry))'], cwd=ROOT,
+                            env=environment, capture_output=True, text=True, check=True).stdout
+    assert int(output) == len(rt.ROTORS_DATA) + 1
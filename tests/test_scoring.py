@@ -0,0 +1,87 @@
+"""
+Check the n-gram models and the french scorer the crackers rank their candidates with
+"""
+
+import math
+import numpy as np
+import pytest
+from scoring import NgramModel, Scorer, get_letter_symbols, get_french_scorer, get_french_frequencies, synthetic_text
+from text import CodeText
+
+CORPUS = 'abab ba'
+
+
+def codes(text: str) -> np.ndarray:
+    return CodeText.from_text(text).symbols()
+
+
+@pytest.fixture(scope='module')
+def bigrams():
+    return NgramModel(CORPUS, n=2, smoothing=0.5)
+
+
+def test_log_probs_are_smoothed_counts(bigrams):
+    # 'ab' twice, 'ba' twice, 'b ' and ' b' once, over 256 * 256 bigrams
+    total = 6 + 0.5 * 256 ** 2
+    assert bigrams.log_probs[ord('a') * 256 + ord('b')] == pytest.approx(math.log(2.5 / total))
+    assert bigrams.log_probs[ord(' ') * 256 + ord('b')] == pytest.approx(math.log(1.5 / total))
+    assert bigrams.log_probs[ord('z') * 256 + ord('z')] == pytest.approx(math.log(0.5 / total))
+
+
+def test_score_sums_ngrams(bigrams):
+    expected = sum(bigrams.log_probs[ord(a) * 256 + ord(b)] for a, b in zip('abz', 'bz '))
+    assert bigrams.score(codes('abz ')[None, :])[0] == pytest.approx(expected)
+    assert bigrams.score(codes('a')[None, :])[0] == 0
+
+
+def test_score_range_splits_score(bigrams):
+    text = codes('abab baba ab')[None, :]
+    assert bigrams.score_range(text, 0, 5) + bigrams.score_range(text, 5, 11) == pytest.approx(bigrams.score(text))
+
+
+def test_letter_symbols_fold_case_and_accents():
+    symbols = get_letter_symbols()
+    assert symbols[ord('e')] == symbols[ord('E')] == symbols[ord('é')] == symbols[ord('Ê')]
+    assert symbols[ord('0')] == symbols[ord('9')] == 3
+    assert symbols[ord(' ')] == 1 and symbols[ord('\n')] == 2
+    assert symbols[ord('§')] == 0 and symbols[ord('.')] != symbols[ord(',')]
+
+
+def test_batch_matches_single():
+    scorer = get_french_scorer()
+    texts = [synthetic_text(300)[i:i + 200] for i in range(0, 100, 25)]
+    batch = scorer.score(np.stack([codes(text) for text in texts]))
+    assert batch == pytest.approx([scorer.score_text(text) for text in texts])
+
+
+def test_threshold_drops_only_bad_candidates():
+    scorer = get_french_scorer()
+    french = codes(synthetic_text(1000))
+    noise = np.random.default_rng(1).integers(0, 256, 1000)
+    scores = scorer.score(np.stack([french, noise]), threshold=-22, step=64)
+    assert scores[0] == pytest.approx(scorer.score(french))
+    assert scores[1] == -np.inf
+
+
+def test_codes_outside_alphabet_are_rare_chars():
+    scorer = get_french_scorer()
+    assert scorer.score_text('Joël ∑ Zoé') == scorer.score_text('Joël \0 Zoé')
+
+
+def test_french_scores_above_noise():
+    scorer = get_french_scorer()
+    noise = str(CodeText(np.random.default_rng(2).integers(0, 256, 5000).astype(np.uint8)))
+    assert scorer.mean_score(synthetic_text(5000)) > -20 > -28 > scorer.mean_score(noise)
+    assert scorer.mean_score('') == 0
+
+
+def test_scorer_adds_models(bigrams):
+    text = codes('abab')
+    assert Scorer([bigrams, bigrams]).score(text) == pytest.approx(2 * Scorer([bigrams]).score(text))
+
+
+def test_frequencies():
+    frequencies = get_french_frequencies()
+    assert frequencies.shape == (256,) and frequencies.sum() == pytest.approx(1)
+    assert frequencies.argmax() in (ord(' '), ord('e'))
+    assert (frequencies > 0).all()
@@ -0,0 +1,77 @@
+"""
+Check the scytale reading order against the table it replaces, and the search over the numbers of columns
+"""
+
+import numpy as np
+import pytest
+from main import Scytale
+from scoring import synthetic_text
+
+CASES = [(1, 2), (7, 2), (7, 3), (10, 4), (100, 7), (101, 50), (1000, 999), (1000, 31)]
+
+
+def read_table(message: str, nb_columns: int) -> str:
+    """
+    Fill one column per chunk of the message, then read the table row by row
+    """
+    size = -(-len(message) // nb_columns)
+    columns = [message[i:i + size] for i in range(0, len(message), size)]
+    return ''.join(column[row] for row in range(size) for column in columns if row < len(column))
+
+
+def encrypt(clear: str, nb_columns: int) -> str:
+    order = Scytale.reading_order(len(clear), nb_columns)
+    message = [''] * len(clear)
+    for index, char in zip(order, clear):
+        message[index] = char
+    return ''.join(message)
+
+
+@pytest.mark.parametrize('length, nb_columns', CASES)
+def test_reading_order_is_the_table(length, nb_columns):
+    message = synthetic_text(length)
+    order = Scytale.reading_order(length, nb_columns)
+    assert sorted(order.tolist()) == list(range(length))
+    assert Scytale(message, nb_columns).decrypt() == read_table(message, nb_columns)
+
+
+@pytest.mark.parametrize('length, nb_columns', CASES)
+def test_reading_order_prefix(length, nb_columns):
+    order = Scytale.reading_order(length, nb_columns)
+    for stop in (0, 1, length // 3, length + 10):
+        assert np.array_equal(Scytale.reading_order(length, nb_columns, stop), order[:stop])
+
+
+def test_slice_reads_only_its_chars():
+    clear = synthetic_text(3000)
+    cipher = Scytale(encrypt(clear, 17), 17)
+    assert cipher.get_clear_slice(500, 620) == clear[500:620]
+    assert cipher.get_clear_slice(-30) == clear[-30:]
+    assert 'clear_message' not in cipher.__dict__
+    assert cipher.clear_message == clear
+
+
+def test_not_encrypted():
+    assert Scytale('message', 3, encrypted=False).clear_message == 'message'
+
+
+@pytest.mark.parametrize('nb_columns', [3, 12, 45])
+def test_crack(nb_columns):
+    clear = synthetic_text(4000)
+    score, found, text = Scytale.crack(encrypt(clear, nb_columns), top=1)[0]
+    assert text == clear
+    assert Scytale.get_chunk_size(len(clear), found) == Scytale.get_chunk_size(len(clear), nb_columns)
+
+
+def test_crack_in_workers_matches():
+    message = encrypt(synthetic_text(2000), 9)
+    assert Scytale.crack(message, batch_size=8, workers=2) == Scytale.crack(message, batch_size=8)
+
+
+def test_rank_scores_each_chunk_size_once():
+    calls = []
+    Scytale.rank_columns(synthetic_text(400), 200, top=1000, progress=lambda *args: calls.append(args))
+    sizes = {Scytale.get_chunk_size(400, nb_columns) for nb_columns in range(2, 201)}
+    scored = Scytale.rank_columns(synthetic_text(400), 200, top=1000)
+    assert len(scored) == len(sizes)
+    assert calls[-1] == ('columns', len(calls), len(calls))
@@ -0,0 +1,159 @@
+"""
+Check the jobs of the decryption service: their events, their results and their cancellation, directly and
+over HTTP
+"""
+
+import json
+import asyncio
+import multiprocessing
+import pytest
+from main import RotorEngine
+from scoring import synthetic_text
+from service import JobService, HTTPError
+
+CLEAR = synthetic_text(2000)
+SHIFTED = ''.join(chr(ord(char) - 3) for char in CLEAR)
+
+
+def serve(test, **options):
+    """
+    Run a test coroutine against a started service, closing it afterwards
+    """
+    async def main():
+        service = JobService(**options)
+        await service.start()
+        try:
+            await asyncio.wait_for(test(service), 60)
+        finally:
+            await service.close()
+    asyncio.run(main())
+
+
+async def events_of(job) -> list:
+    return [event async for event in job.follow()]
+
+
+def long_job() -> dict:
+    message = RotorEngine((4, 1, 6), index_offsets=(9, 8, 7)).crypt(synthetic_text(30000))
+    return {'action': 'crack', 'cipher': 'enigma', 'message': message}
+
+
+def test_decrypt_job():
+    async def test(service):
+        job = service.submit({'action': 'decrypt', 'cipher': 'shift', 'key': 3, 'message': SHIFTED})
+        events = await events_of(job)
+        assert [event['event'] for event in events] == ['queued', 'started', 'done']
+        assert job.state == 'done' and job.message is None
+        assert job.summary()['result']['clear'] == CLEAR
+        assert job.result['solved'] is True
+    serve(test, max_jobs=1)
+
+
+def test_solve_job_reports_fingerprint():
+    async def test(service):
+        job = service.submit({'message': SHIFTED})
+        events = await events_of(job)
+        fingerprint = next(event for event in events if event['event'] == 'fingerprint')
+        assert fingerprint['cipher'] == 'shift' and job.cipher == 'shift'
+        assert job.result['key'] == 3 and job.result['clear'] == CLEAR
+    serve(test, max_jobs=1)
+
+
+def test_failed_job():
+    async def test(service):
+        job = service.submit({'action': 'decrypt', 'cipher': 'vigenere', 'key': 'not shifts', 'message': SHIFTED})
+        assert (await events_of(job))[-1]['event'] == 'failed'
+        assert job.summary()['error'].startswith('ValueError')
+    serve(test, max_jobs=1)
+
+
+@pytest.mark.parametrize('request_body', [
+    [], {'message': 3}, {'action': 'guess', 'message': ''}, {'action': 'decrypt', 'cipher': 'shift', 'message': ''},
+    {'action': 'crack', 'cipher': 'caesar', 'message': ''},
+    {'action': 'crack', 'cipher': 'shift', 'message': '', 'crib': 'Joel'}])
+def test_bad_requests_refused(request_body):
+    async def test(service):
+        with pytest.raises(HTTPError) as error:
+            service.submit(request_body)
+        assert error.value.status == 400
+        assert not service.jobs
+    serve(test, max_jobs=1)
+
+
+def test_full_queue_refused():
+    async def test(service):
+        service.submit({'message': SHIFTED})
+        with pytest.raises(HTTPError) as error:
+            service.submit({'message': SHIFTED})
+        assert error.value.status == 503
+    serve(test, max_jobs=1, max_queued=1)
+
+
+def test_cancel_running_and_queued_jobs():
+    async def test(service):
+        running = service.submit(long_job())
+        queued = service.submit({'message': SHIFTED})
+        async for event in running.follow():
+            if event['event'] == 'started':
+                break
+        assert running.state == 'running' and queued.state == 'queued'
+        await service.cancel(queued)
+        await service.cancel(running)
+        assert running.state == queued.state == 'cancelled'
+        assert running.events[-1]['event'] == 'cancelled'
+        assert 'started' not in [event['event'] for event in queued.events]
+        assert not multiprocessing.active_children()
+    serve(test, max_jobs=1)
+
+
+def test_finished_jobs_are_bounded():
+    async def test(service):
+        jobs = [service.submit({'action': 'decrypt', 'cipher': 'shift', 'key': 3, 'message': 'abc'})
+                for i in range(3)]
+        for job in jobs:
+            await events_of(job)
+        # the runner retires a job once its task is over
+        while len(service.jobs) > 1:
+            await asyncio.sleep(0.01)
+        assert list(service.jobs) == [jobs[-1].id]
+    serve(test, max_jobs=1, max_finished=1)
+
+
+async def http(port: int, method: str, path: str, payload=None) -> tuple:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = b'' if payload is None else json.dumps(payload).encode('utf8')
+    writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    response = await reader.read()
+    writer.close()
+    head, separator, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), head.decode('latin-1'), body
+
+
+def test_http_routes():
+    async def test(service):
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            status, head, body = await http(port, 'POST', '/jobs?stream=1',
+                                            {'action': 'decrypt', 'cipher': 'shift', 'key': 3, 'message': SHIFTED})
+            assert status == 200 and 'chunked' in head
+            lines, rest = [], body
+            while True:
+                size, separator, rest = rest.partition(b'\r\n')
+                if not int(size, 16):
+                    break
+                lines.append(json.loads(rest[:int(size, 16)]))
+                rest = rest[int(size, 16) + 2:]
+            assert lines[-1]['event'] == 'done' and lines[-1]['result']['clear'] == CLEAR
+            job_id = lines[0]['job']
+            status, head, body = await http(port, 'GET', f'/jobs/{job_id}')
+            assert status == 200 and json.loads(body)['state'] == 'done'
+            status, head, body = await http(port, 'POST', '/jobs', long_job())
+            assert status == 202
+            status, head, body = await http(port, 'DELETE', f'/jobs/{json.loads(body)["id"]}')
+            assert status == 200 and json.loads(body)['state'] == 'cancelled'
+            assert [job['state'] for job in json.loads((await http(port, 'GET', '/jobs'))[2])] == ['done', 'cancelled']
+            assert (await http(port, 'GET', '/jobs/404'))[0] == 404
+            assert (await http(port, 'PUT', '/jobs'))[0] == 405
+            assert (await http(port, 'POST', '/jobs', ['not', 'an', 'object']))[0] == 400
+    serve(test, max_jobs=1)
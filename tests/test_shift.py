@@ -0,0 +1,76 @@
+"""
+Check that the translate table and the code point array give the same shift decryption
+"""
+
+import pytest
+from main import Shift, get_shift_table
+from scoring import synthetic_text
+from text import CodeText
+
+
+def reference_shift(text: str, shift: int) -> str:
+    return ''.join(chr(ord(char) + shift) for char in text)
+
+
+class TestDecrypt:
+
+    @pytest.mark.parametrize('size', [0, 10, 4095, 4096, 20000])
+    @pytest.mark.parametrize('shift', [-7, 0, 13])
+    def test_paths_agree(self, size, shift):
+        text = synthetic_text(size)
+        expected = reference_shift(text, shift)
+        cipher = Shift(text, encrypted=False)
+        assert cipher.decrypt(text, shift) == expected
+        assert cipher.decrypt(CodeText.from_text(text), shift) == expected
+        assert Shift.multi_decrypt(text, [shift]) == expected
+
+    def test_wide_chars(self):
+        text = 'ħ∑ Joël ' * 600
+        for message in (text[:100], text):
+            assert Shift(message, encrypted=False).decrypt(message, 300) == reference_shift(message, 300)
+
+    @pytest.mark.parametrize('size', [10, 5000])
+    def test_out_of_range_raises(self, size):
+        message = 'a' * size
+        with pytest.raises(ValueError):
+            Shift(message, encrypted=False).decrypt(message, -98)
+
+    def test_table_is_cached_and_filled_lazily(self):
+        table = get_shift_table(5)
+        assert get_shift_table(5) is table
+        'abc'.translate(table)
+        assert {ord('a'), ord('b'), ord('c')} <= set(table)
+
+
+class TestCipher:
+
+    @pytest.fixture
+    def clear(self):
+        return synthetic_text(6000)
+
+    def test_auto_shift(self, clear):
+        message = reference_shift(clear, -9)
+        cipher = Shift(message)
+        assert cipher.shifts == [9]
+        assert cipher.clear_message == clear
+
+    def test_given_shift(self, clear):
+        assert Shift(reference_shift(clear, -4), nb_shift=4, auto_shift=False).clear_message == clear
+
+    def test_multiple_shifts(self, clear):
+        shifts = [3, -2, 5]
+        message = Shift.multi_decrypt(clear, [-shift for shift in shifts])
+        cipher = Shift(message, nb_m_shift=3, multiple_shift=True)
+        assert cipher.shifts == shifts
+        assert cipher.clear_message == clear
+
+    def test_slice_does_not_decrypt_everything(self, clear):
+        shifts = [3, -2, 5]
+        cipher = Shift(Shift.multi_decrypt(clear, [-shift for shift in shifts]), nb_m_shift=3, multiple_shift=True)
+        assert cipher.get_clear_slice(1001, 1100) == clear[1001:1100]
+        assert 'clear_message' not in cipher.__dict__
+
+    def test_clear_message_kept(self, clear):
+        cipher = Shift(clear, encrypted=False)
+        assert cipher.clear_message is clear
+        assert cipher.get_clear_slice(10, 20) == clear[10:20]
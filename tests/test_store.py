@@ -0,0 +1,107 @@
+"""
+Check that the message store loads messages lazily and backs their codes with shared maps
+"""
+
+import os
+import mmap
+import numpy as np
+import pytest
+from store import MessageStore
+
+
+def write(directory, name: str, data: bytes):
+    path = directory / name
+    path.write_bytes(data)
+    return path
+
+
+def mapped(codes) -> bool:
+    base = codes.codes
+    while isinstance(base, np.ndarray):
+        base = base.base
+    return isinstance(base, memoryview) and isinstance(base.obj, mmap.mmap)
+
+
+@pytest.fixture
+def messages(tmp_path):
+    directory = tmp_path / 'messages'
+    directory.mkdir()
+    write(directory, 'plain.txt', b'Joel and Zoe')
+    write(directory, 'accents.txt', 'Joël et Zoé'.encode('utf8'))
+    write(directory, 'wide.txt', 'ħŬ Joël'.encode('utf8'))
+    write(directory, 'lines.txt', b'one\r\ntwo\rthree')
+    write(directory, 'empty.txt', b'')
+    write(directory, 'notes.md', b'not a message')
+    return directory
+
+
+def test_index(messages):
+    store = MessageStore(str(messages), codes_directory=str(messages.parent / 'codes'))
+    assert store.index is None
+    assert list(store) == ['accents', 'empty', 'lines', 'plain', 'wide']
+    assert 'notes' not in store
+    assert store['accents'] == 'Joël et Zoé'
+    assert store['lines'] == 'one\ntwo\nthree'
+    assert store['empty'] == ''
+
+
+def test_plain_codes_map_the_file(messages):
+    store = MessageStore(str(messages), codes_directory=None)
+    codes = store.codes('plain')
+    assert codes == 'Joel and Zoe'
+    assert codes.codes.dtype == np.uint8
+    assert mapped(codes)
+    assert not codes.codes.flags.writeable
+
+
+def test_latin1_codes_map_the_file(tmp_path):
+    write(tmp_path, 'latin.txt', 'Joël'.encode('latin-1'))
+    store = MessageStore(str(tmp_path), encoding='latin-1', codes_directory=None)
+    assert mapped(store.codes('latin'))
+    assert store.codes('latin') == 'Joël'
+
+
+@pytest.mark.parametrize('name, dtype, suffix', [('accents', np.uint8, '.u8'), ('wide', np.uint32, '.u32'),
+                                                 ('lines', np.uint8, '.u8')])
+def test_decoded_codes_are_shared(messages, name, dtype, suffix):
+    directory = messages.parent / 'codes'
+    codes = MessageStore(str(messages), codes_directory=str(directory)).codes(name)
+    assert codes.codes.dtype == dtype
+    assert mapped(codes)
+    assert codes == MessageStore(str(messages), codes_directory=None)[name]
+    files = os.listdir(directory)
+    assert len(files) == 1 and files[0].endswith(suffix)
+    written = os.stat(directory / files[0]).st_mtime_ns
+    again = MessageStore(str(messages), codes_directory=str(directory)).codes(name)
+    assert again == codes
+    assert os.stat(directory / files[0]).st_mtime_ns == written
+
+
+def test_decoded_codes_follow_the_file(messages):
+    directory = messages.parent / 'codes'
+    assert MessageStore(str(messages), codes_directory=str(directory)).codes('accents') == 'Joël et Zoé'
+    path = write(messages, 'accents.txt', 'ħ Zoé'.encode('utf8'))
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+    store = MessageStore(str(messages), codes_directory=str(directory))
+    assert store.codes('accents') == 'ħ Zoé'
+    assert [file[-4:] for file in os.listdir(directory)] == ['.u32']
+
+
+def test_codes_without_directory(messages, monkeypatch):
+    monkeypatch.setenv('CRYPTO_CACHE', 'off')
+    codes = MessageStore(str(messages)).codes('accents')
+    assert codes == 'Joël et Zoé'
+    assert codes.codes.dtype == np.uint8
+    assert not mapped(codes)
+    assert MessageStore(str(messages)).codes('empty') == ''
+
+
+def test_maps_are_bounded(messages):
+    store = MessageStore(str(messages), cache_size=2, codes_directory=None)
+    for name in store:
+        store.codes(name)
+        store.text(name)
+        assert len(store.buffers) <= 2
+        assert len(store.texts) <= 2
+    store.refresh()
+    assert not store.buffers and not store.texts and store.index is None
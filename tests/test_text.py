@@ -0,0 +1,57 @@
+"""
+Check the compact text type and the single policy for codes outside the 256 symbols alphabet
+"""
+
+import numpy as np
+import pytest
+from text import CodeText, to_alphabet
+from histogram import Histogram
+from scoring import get_french_scorer
+
+
+@pytest.mark.parametrize('text, dtype', [('Joël', np.uint8), ('', np.uint8), ('ħŬ ok', np.uint32),
+                                         ('émoji 🙂', np.uint32)])
+def test_round_trip(text, dtype):
+    codes = CodeText.from_text(text)
+    assert codes.codes.dtype == dtype
+    assert str(codes) == text
+    assert codes.codes.tolist() == [ord(char) for char in text]
+    assert CodeText.from_text(list(text)) == text
+
+
+def test_slices_share_the_codes():
+    text = CodeText.from_text('abcdefgh')
+    part = text[2:6]
+    assert isinstance(part, CodeText)
+    assert part == 'cdef'
+    assert np.shares_memory(part.codes, text.codes)
+    assert text[3] == 'd'
+
+
+def test_narrowed_from_wide_codes():
+    assert CodeText(np.array([74, 111, 235, 108])).codes.dtype == np.uint8
+    assert CodeText(np.array([74, 0x10FFFF])).wide
+    with pytest.raises(ValueError):
+        CodeText(np.array([-1, 65]))
+    with pytest.raises(ValueError):
+        CodeText(np.array([0x110000]))
+
+
+def test_to_alphabet():
+    codes = np.array([-3, 0, 65, 255, 256, 8217])
+    assert to_alphabet(codes).tolist() == [0, 0, 65, 255, 0, 0]
+    narrow = np.arange(256, dtype=np.uint8)
+    assert to_alphabet(narrow) is narrow
+    assert CodeText.from_text('a’b').symbols().tolist() == [97, 0, 98]
+
+
+def test_scorer_uses_the_policy():
+    scorer = get_french_scorer()
+    assert scorer.score_text('l’été') == scorer.score(np.array([108, 0, 233, 116, 233]))
+    assert scorer.score(np.array([108, 300, 233])) == scorer.score(np.array([108, -5, 233]))
+
+
+def test_histogram_from_codes():
+    text = 'aaab€'
+    assert Histogram.from_text(text).to_dict() == {'a': 3, 'b': 1, '€': 1}
+    assert Histogram.from_text(CodeText.from_text(text)).to_dict() == Histogram.from_text(text).to_dict()
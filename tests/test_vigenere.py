@@ -0,0 +1,89 @@
+"""
+Check the recovery of the key length and shifts of Vigenere messages
+"""
+
+import random
+import pytest
+from scoring import read_reference
+from histogram import Histogram
+from main import Shift, Vigenere
+
+
+@pytest.fixture(scope='module')
+def french():
+    text = ''.join(char for char in read_reference() if ord(char) < 256)
+    return (text * (60000 // len(text) + 1))[:60000]
+
+
+def encrypt(text: str, shifts: list) -> str:
+    return Shift.multi_decrypt(text, [-shift for shift in shifts])
+
+
+def make_key(length: int, seed: int) -> list:
+    generator = random.Random(seed)
+    return [generator.randrange(-49, 0) for _ in range(length)]
+
+
+@pytest.mark.parametrize('size, length', [(300, 12), (300, 17), (2000, 7), (20000, 3), (50000, 45)])
+def test_key_recovered(french, size, length):
+    shifts = make_key(length, size + length)
+    text = french[1000:1000 + size]
+    cipher = Vigenere(encrypt(text, shifts))
+    assert cipher.key == length
+    assert cipher.shifts == shifts
+    assert cipher.clear_message == text
+
+
+def test_key_longer_than_40(french):
+    shifts = make_key(60, 0)
+    cipher = Vigenere(encrypt(french[:50000], shifts))
+    assert cipher.search_key() == 60
+
+
+def test_kasiski_share(french):
+    cipher = Vigenere(encrypt(french[:20000], make_key(6, 1)))
+    shares = cipher.kasiski(share=0.9)
+    assert {2, 3, 6} <= set(shares)
+    assert all(share >= 0.9 for share in shares.values())
+    assert all(6 % length == 0 or length % 6 == 0 for length in shares)
+
+
+def test_key_length_without_repetitions(french):
+    cipher = Vigenere(encrypt(french[2000:2120], make_key(5, 2)))
+    assert cipher.kasiski(share=0.9) == {}
+    assert cipher.rank_key_lengths()[0][1] == 5
+
+
+def test_multiple_of_the_key_not_taken(french):
+    cipher = Vigenere(encrypt(french[2000:2200], make_key(4, 2)))
+    assert 4 in cipher.kasiski(share=0.9)
+    assert cipher.search_key() == 4
+
+
+def test_known_shifts(french):
+    shifts = make_key(9, 3)
+    message = encrypt(french[:5000], shifts)
+    cipher = Vigenere(message, shifts=shifts)
+    assert cipher.key == 9
+    assert cipher.clear_message == french[:5000]
+    assert cipher.get_clear_slice(1234, 1300) == french[1234:1300]
+
+
+def test_short_columns_shifts(french):
+    shifts = make_key(12, 2)
+    cipher = Vigenere(encrypt(french[:300], shifts))
+    assert cipher.get_shifts(12) == shifts
+    assert cipher.key == 12
+    assert cipher.clear_message == french[:300]
+
+
+def test_wrong_key_length_keeps_codes_valid(french):
+    cipher = Vigenere(encrypt(french[:50000], make_key(45, 4)))
+    columns = Histogram.strided(cipher.text, 15)
+    spans = [len(column.counts) - int(column.counts.nonzero()[0][0]) for column in columns]
+    assert max(spans) > 256
+    shifts = cipher.get_shifts(15)
+    for column, shift in zip(columns, shifts):
+        assert column.counts.nonzero()[0][0] + shift >= 0
+    clear = cipher.decrypt_with(cipher.message, shifts)
+    assert len(clear) == 50000
@@ -0,0 +1,95 @@
+"""
+Give the compact text type shared by the ciphers: the code points of a text in an array of one byte
+per char when they are all below 256, as in enigma's alphabet, and of four bytes otherwise
+A text is converted once when it comes in and once when it goes out, the ciphers working on its codes
+"""
+
+import numpy as np
+
+
+def to_alphabet(codes) -> np.ndarray:
+    """
+    Get codes in enigma's 256 symbols alphabet, the codes outside it becoming 0 like the other rare chars
+    This is the only place a code out of the alphabet is dealt with, for the scorer and the models alike
+    :param codes: array of codes of any integer type, possibly shifted out of the code points
+    :return uint8 array of codes, the array itself when it already is one:
+    """
+    codes = np.asarray(codes)
+    if codes.dtype == np.uint8:
+        return codes
+    return np.where((codes >= 0) & (codes < 256), codes, 0).astype(np.uint8)
+
+
+class CodeText:
+
+    def __init__(self, codes):
+        """
+        Init
+        :param codes: array of code points, stored as uint8 when they are all below 256 and as uint32 otherwise
+        """
+        codes = np.asarray(codes)
+        if codes.dtype != np.uint8 and codes.dtype != np.uint32:
+            if len(codes) and (codes.min() < 0 or codes.max() >= 0x110000):
+                raise ValueError("code point not in range(0x110000)")
+            codes = codes.astype(np.uint8 if not len(codes) or codes.max() < 256 else np.uint32)
+        self.codes = codes
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Get the codes of a text
+        :param text: str, list of chars or CodeText
+        :return code text:
+        """
+        if isinstance(text, cls):
+            return text
+        if not isinstance(text, str):
+            text = ''.join(text)
+        try:
+            return cls(np.frombuffer(text.encode('latin-1'), dtype=np.uint8))
+        except UnicodeEncodeError:
+            return cls(np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32))
+
+    @property
+    def wide(self) -> bool:
+        """
+        Whether a code needs four bytes
+        :return bool:
+        """
+        return self.codes.dtype == np.uint32
+
+    def widen(self) -> np.ndarray:
+        """
+        Get a copy of the codes that can be shifted without overflow
+        :return int64 array of codes:
+        """
+        return self.codes.astype(np.int64)
+
+    def symbols(self) -> np.ndarray:
+        """
+        Get the codes in enigma's 256 symbols alphabet, see to_alphabet
+        :return uint8 array of codes, a view of the codes when none is above 255:
+        """
+        return to_alphabet(self.codes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return chr(self.codes[index])
+        return CodeText(self.codes[index])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (CodeText, str, list)):
+            return NotImplemented
+        other = CodeText.from_text(other)
+        return len(self) == len(other) and bool(np.array_equal(self.codes, other.codes))
+
+    def __str__(self) -> str:
+        if not self.wide:
+            return self.codes.tobytes().decode('latin-1')
+        return self.codes.astype('<u4').tobytes().decode('utf-32-le', 'surrogatepass')
+
+    def __repr__(self) -> str:
+        return f'CodeText({str(self)!r})'